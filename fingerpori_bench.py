@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from datetime import date, timedelta
+from typing import Any
+
+from fingerpori_db import DbManager
+
+logger = logging.getLogger("fingerpori_bench")
+
+CHUNK = 50_000
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def chunked(rows: Iterator[tuple[Any, ...]], size: int = CHUNK):
+    chunk: list[tuple[Any, ...]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Scale:
+    def __init__(self, guilds: int, days: int, votes: int, open_comics: int, seed: int):
+        self.guilds: int = guilds
+        self.days: int = days
+        self.votes: int = votes
+        self.open_comics: int = min(open_comics, days)
+        self.seed: int = seed
+
+    def guild_id(self, g: int) -> int:
+        return 10**17 + g
+
+    def message_id(self, comic_id: int, g: int) -> int:
+        # comic ids start from 1, keep message ids unique per (comic, guild)
+        return 10**15 + (comic_id - 1) * self.guilds + g
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "guilds": self.guilds,
+            "days": self.days,
+            "votes": self.votes,
+            "open_comics": self.open_comics,
+            "seed": self.seed,
+        }
+
+
+async def fill(db: DbManager, scale: Scale) -> dict[str, float]:
+    """Bulk loads synthetic guilds, comics, messages and votes."""
+    conn = db.connection
+    timings: dict[str, float] = {}
+    rng = random.Random(scale.seed)
+    first_day = date.today() - timedelta(days=scale.days - 1)
+
+    await conn.execute("PRAGMA synchronous = OFF")
+
+    start = time.perf_counter()
+    for chunk in chunked(
+        (scale.guild_id(g), scale.guild_id(g) + 1, 1) for g in range(scale.guilds)
+    ):
+        await conn.executemany(
+            "INSERT INTO guild (guild_id, channel_id, rating_mode) VALUES (?, ?, ?)",
+            chunk,
+        )
+    await conn.commit()
+    timings["guild"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    closed_until = scale.days - scale.open_comics
+    for chunk in chunked(
+        (
+            d + 1,
+            (first_day + timedelta(days=d)).isoformat(),
+            f"{d:016x}",
+            f"https://example.invalid/{d:016x}/1920.jpg",
+            f"images/{d:016x}.jpg",
+            1 if d < closed_until else 0,
+        )
+        for d in range(scale.days)
+    ):
+        await conn.executemany(
+            "INSERT INTO comic (comic_id, date, hash, url, path, poll_closed) VALUES (?, ?, ?, ?, ?, ?)",
+            chunk,
+        )
+    await conn.commit()
+    timings["comic"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in chunked(
+        (
+            scale.guild_id(g),
+            c,
+            scale.message_id(c, g),
+            scale.guild_id(g) + 1,
+        )
+        for c in range(1, scale.days + 1)
+        for g in range(scale.guilds)
+    ):
+        await conn.executemany(
+            "INSERT INTO message (guild_id, comic_id, message_id, channel_id) VALUES (?, ?, ?, ?)",
+            chunk,
+        )
+    await conn.commit()
+    timings["message"] = time.perf_counter() - start
+
+    def votes() -> Iterator[tuple[int, int, int, int]]:
+        per_comic, extra = divmod(scale.votes, scale.days)
+        for c in range(1, scale.days + 1):
+            for user in range(per_comic + (1 if c <= extra else 0)):
+                g = rng.randrange(scale.guilds)
+                yield (c, user + 1, rng.randint(1, 5), scale.message_id(c, g))
+
+    start = time.perf_counter()
+    for chunk in chunked(votes()):
+        await conn.executemany(
+            "INSERT INTO vote (comic_id, user_id, rating, message_id) VALUES (?, ?, ?, ?)",
+            chunk,
+        )
+    await conn.commit()
+    timings["vote"] = time.perf_counter() - start
+
+    await conn.execute("PRAGMA synchronous = FULL")
+    await conn.execute("ANALYZE")
+    await conn.commit()
+    return timings
+
+
+async def measure(
+    name: str,
+    iterations: int,
+    op: Callable[[int], Awaitable[Any]],
+    reset: Callable[[], Awaitable[Any]] | None = None,
+) -> dict[str, float | int | str]:
+    samples: list[float] = []
+    for i in range(iterations):
+        if reset:
+            await reset()
+        start = time.perf_counter()
+        await op(i)
+        samples.append(time.perf_counter() - start)
+    total = sum(samples)
+    result: dict[str, float | int | str] = {
+        "name": name,
+        "iterations": iterations,
+        "total_s": total,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+        "ops_per_s": iterations / total if total > 0 else 0.0,
+    }
+    logger.info(
+        f"{name}: p50 {result['p50_ms']:.3f} ms\tp99 {result['p99_ms']:.3f} ms"
+    )
+    return result
+
+
+async def run_benchmarks(db: DbManager, scale: Scale, iterations: int):
+    rng = random.Random(scale.seed + 1)
+    latest = scale.days
+    open_ids = set(range(scale.days - scale.open_comics + 1, scale.days + 1))
+    results: list[dict[str, float | int | str]] = []
+
+    def random_guild() -> int:
+        return rng.randrange(scale.guilds)
+
+    async def save_vote(i: int):
+        g = random_guild()
+        await db.save_vote(
+            latest, 10**9 + i, rng.randint(1, 5), scale.message_id(latest, g)
+        )
+
+    async def get_votes(_: int):
+        await db.get_votes(scale.guild_id(random_guild()), rng.randint(1, latest))
+
+    async def get_guild_user_votes(_: int):
+        await db.get_guild_user_votes(scale.guild_id(random_guild()), latest)
+
+    async def get_active_messages(_: int):
+        await db.get_active_messages()
+
+    async def reopen():
+        placeholder = ", ".join(["?"] * len(open_ids))
+        await db.connection.execute(
+            f"UPDATE comic SET poll_closed = 0 WHERE comic_id IN ({placeholder})",
+            list(open_ids),
+        )
+        await db.connection.execute(
+            f"UPDATE message SET poll_closed = 0 WHERE comic_id IN ({placeholder})",
+            list(open_ids),
+        )
+        await db.connection.commit()
+        db.clear_cache()
+
+    async def close_polls(_: int):
+        await db.close_polls(open_ids)
+
+    async def get_past_n_comics(_: int):
+        await db.get_past_n_comics(rng.choice((1, 7, 30)))
+
+    async def clear_cache():
+        db.clear_cache()
+
+    results.append(await measure("save_vote", iterations, save_vote))
+    results.append(await measure("get_votes", iterations, get_votes))
+    results.append(
+        await measure("get_guild_user_votes", iterations, get_guild_user_votes)
+    )
+    results.append(
+        await measure(
+            "get_active_messages", max(1, iterations // 10), get_active_messages
+        )
+    )
+    results.append(
+        await measure("close_polls", max(1, iterations // 10), close_polls, reopen)
+    )
+    await reopen()
+    # the cold path hits sqlite like the query did before DbManager cached it
+    results.append(
+        await measure("get_past_n_comics", iterations, get_past_n_comics, clear_cache)
+    )
+    results.append(
+        await measure("get_past_n_comics_cached", iterations, get_past_n_comics)
+    )
+    return results
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    for result in results:
+        old = baseline.get(result["name"])
+        if old and old["p50_ms"]:
+            result["p50_vs_baseline"] = result["p50_ms"] / old["p50_ms"]
+            result["p99_vs_baseline"] = result["p99_ms"] / old["p99_ms"]
+
+
+async def main(args: argparse.Namespace):
+    scale = Scale(args.guilds, args.days, args.votes, args.open_comics, args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="fpori-bench-") as tmp:
+        path = args.db or os.path.join(tmp, "bench.db")
+        reuse = args.db is not None and os.path.exists(args.db)
+        db = await DbManager(path).connect()
+        try:
+            fill_timings: dict[str, float] = {}
+            if reuse:
+                logger.info(f"reusing existing bench db {path}")
+            else:
+                logger.info(f"filling {path}: {scale.as_dict()}")
+                fill_timings = await fill(db, scale)
+            results = await run_benchmarks(db, scale, args.iterations)
+        finally:
+            await db.close()
+
+        report: dict[str, Any] = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "scale": scale.as_dict(),
+            "db_bytes": os.path.getsize(path),
+            "fill_s": fill_timings,
+            "results": results,
+        }
+    if args.baseline:
+        compare(report["results"], args.baseline)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark DbManager queries against a synthetic db"
+    )
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--votes", type=int, default=1_000_000)
+    parser.add_argument("--open-comics", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--db", help="keep the synthetic db at this path, reused if it exists"
+    )
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--output", help="write the json report here")
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=sys.stderr,
+        format="[{asctime}] [{levelname:<8}] {name}: {message}",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        style="{",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -1,46 +1,50 @@
+import asyncio
 import io
 import logging
 import os
 import sys
 import zoneinfo
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta, timezone
 from typing import Any, override
 
 import discord
 from discord import TextChannel, app_commands
 from discord.ext import commands, tasks
 from discord.user import User
-from discord.utils import _ColourFormatter  # pyright: ignore[reportPrivateUsage]
 from dotenv import load_dotenv
 from PIL import Image, ImageOps
 
+import fingerpori_export as export
 import fingerpori_scraper as scraper
-from fingerpori_db import DbManager, RatingMode
+from fingerpori_db import (
+    Comic,
+    ComicScore,
+    DbManager,
+    DeliveryState,
+    GuildData,
+    DEFAULT_SOURCE,
+    RatingMode,
+    image_hash,
+)
+from fingerpori_logging import setup_logging
+from fingerpori_outbound import OutboundScheduler, Priority
+from fingerpori_schedule import GuildSchedule, GuildScheduler, TimerKind, last_fire
+from fingerpori_sources import SOURCES
+from fingerpori_watchdog import LoopWatchdog
 
 load_dotenv()
 
 
-# logging setup
-discord.utils.setup_logging(level=logging.INFO)
-
-root_logger = logging.getLogger()
-console_handler = root_logger.handlers[0]
-
-console_formatter = _ColourFormatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    style="{",
-)
-console_handler.setFormatter(console_formatter)
-
-file_handler = logging.FileHandler("bot.log", encoding="utf-8", mode="w")
-file_formatter = logging.Formatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    style="{",
+# logging setup, records are written on a background thread
+log_listener = setup_logging(
+    level=logging.getLevelNamesMapping().get(
+        os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO
+    ),
+    path=os.getenv("LOG_FILE", "bot.log"),
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    backups=int(os.getenv("LOG_BACKUPS", "5")),
+    json_output=os.getenv("LOG_JSON", "0") == "1",
 )
-file_handler.setFormatter(file_formatter)
-root_logger.addHandler(file_handler)
 
 logger = logging.getLogger("fingerpori_bot")
 
@@ -48,13 +52,39 @@ logger = logging.getLogger("fingerpori_bot")
 # post times
 TIMEZONE = zoneinfo.ZoneInfo("Europe/Helsinki")
 phour, pminute = map(int, os.getenv("POST_TIME", "03:00").split(":"))
-post_dt = datetime.now(TIMEZONE).replace(
-    hour=phour, minute=pminute, second=0, microsecond=0
-)
-sub_dt = post_dt - timedelta(minutes=5)
 
-POST_TIME = post_dt.timetz()
-SUB_TIME = sub_dt.timetz()
+# default for guilds without their own post time, polls close 5 min before
+POST_TIME = time(phour, pminute)
+CLOSE_BEFORE = timedelta(minutes=5)
+# guilds on the default post time are spread over this many seconds
+POST_SPREAD = int(os.getenv("POST_SPREAD", "300"))
+# minimum seconds between scrapes while today's comic is missing
+SCRAPE_RETRY = 600
+# delivery journal updates are written this many guilds at a time
+DELIVERY_BATCH = 50
+# comics sharing one message, a message has room for five button rows
+POST_BATCH = 5
+# native polls outlive the close timer, which ends them early
+POLL_DURATION = timedelta(hours=24)
+# seconds to wait for discord to finalise the counts of an ended poll
+POLL_FINALISE_WAIT = 2.0
+MAINTENANCE_TIME = (
+    datetime.combine(datetime.today(), POST_TIME) + timedelta(minutes=30)
+).time().replace(tzinfo=TIMEZONE)
+
+# maintenance, retention of -1 keeps raw votes forever
+VOTE_RETENTION_DAYS = int(os.getenv("VOTE_RETENTION_DAYS", "-1"))
+VOTE_ARCHIVE_PATH = os.getenv("VOTE_ARCHIVE_PATH", "")
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+# outbound api calls
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))
+OUTBOUND_RESERVED = int(os.getenv("OUTBOUND_RESERVED", "4"))
+OUTBOUND_QUEUE = int(os.getenv("OUTBOUND_QUEUE", "1000"))
+OUTBOUND_INTERVAL = float(os.getenv("OUTBOUND_INTERVAL", "0.25"))
+
+# event loop stalls longer than this many ms are logged with the blocking stack
+WATCHDOG_THRESHOLD = int(os.getenv("WATCHDOG_THRESHOLD", "250"))
 
 
 # env
@@ -67,6 +97,24 @@ if TOKEN is None:
     sys.exit("no token provided")
 
 
+def guild_schedule(guild: GuildData) -> GuildSchedule:
+    post_time = POST_TIME
+    offset = timedelta(seconds=guild.guild_id % POST_SPREAD if POST_SPREAD > 0 else 0)
+    if guild.post_time:
+        try:
+            post_time = time.fromisoformat(guild.post_time)
+            offset = timedelta()
+        except ValueError:
+            logger.warning(f"guild {guild.guild_id} has bad post time {guild.post_time}")
+    tz = TIMEZONE
+    if guild.timezone:
+        try:
+            tz = zoneinfo.ZoneInfo(guild.timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"guild {guild.guild_id} has bad timezone {guild.timezone}")
+    return GuildSchedule(post_time, tz, offset)
+
+
 def is_owner():
     def predicate(interaction: discord.Interaction) -> bool:
         return interaction.user.id == USER_ID
@@ -74,56 +122,36 @@ def is_owner():
     return app_commands.check(predicate)
 
 
+# reactions used as ratings in RatingMode.REACTION
+RATING_EMOJIS = {"1️⃣": 1, "2️⃣": 2, "3️⃣": 3, "4️⃣": 4, "5️⃣": 5}
+
+
+def rating_poll() -> discord.Poll:
+    """Native poll for RatingMode.POLL, answer ids 1-5 match the ratings"""
+    poll = discord.Poll(question="Arvosana?", duration=POLL_DURATION)
+    for emoji in RATING_EMOJIS:
+        poll.add_answer(text=str(RATING_EMOJIS[emoji]), emoji=emoji)
+    return poll
+
+
 class PostView(discord.ui.View):
-    def __init__(self, comic_id: int):
+    """Rating buttons, one row per comic of the message"""
+
+    def __init__(self, *comic_ids: int):
         super().__init__(timeout=None)
-        self.comic_id: int = comic_id
-
-        self.add_item(
-            discord.ui.Button(
-                style=discord.ButtonStyle.grey,
-                label="0",
-                custom_id=f"fpori:{self.comic_id}:1",
-                row=0,
-                emoji="1️⃣",
-            )
-        )
-        self.add_item(
-            discord.ui.Button(
-                style=discord.ButtonStyle.grey,
-                label="0",
-                custom_id=f"fpori:{self.comic_id}:2",
-                row=0,
-                emoji="2️⃣",
-            )
-        )
-        self.add_item(
-            discord.ui.Button(
-                style=discord.ButtonStyle.grey,
-                label="0",
-                custom_id=f"fpori:{self.comic_id}:3",
-                row=0,
-                emoji="3️⃣",
-            )
-        )
-        self.add_item(
-            discord.ui.Button(
-                style=discord.ButtonStyle.grey,
-                label="0",
-                custom_id=f"fpori:{self.comic_id}:4",
-                row=0,
-                emoji="4️⃣",
-            )
-        )
-        self.add_item(
-            discord.ui.Button(
-                style=discord.ButtonStyle.grey,
-                label="0",
-                custom_id=f"fpori:{self.comic_id}:5",
-                row=0,
-                emoji="5️⃣",
-            )
-        )
+        self.comic_ids: tuple[int, ...] = comic_ids
+
+        for row, comic_id in enumerate(comic_ids):
+            for emoji, rating in RATING_EMOJIS.items():
+                self.add_item(
+                    discord.ui.Button(
+                        style=discord.ButtonStyle.grey,
+                        label="0",
+                        custom_id=f"fpori:{comic_id}:{rating}",
+                        row=row,
+                        emoji=emoji,
+                    )
+                )
 
 
 class FingerporiBot(commands.Bot):
@@ -132,29 +160,57 @@ class FingerporiBot(commands.Bot):
         intents.message_content = True
         intents.guilds = True
         intents.guild_reactions = True
-        intents.polls = True
+        # native polls are only read when they close, per-click poll events aren't needed
+        intents.polls = False
         intents.members = True
         super().__init__(command_prefix="/", intents=intents)
 
         self.db: DbManager = db
+        self.outbound: OutboundScheduler = OutboundScheduler(
+            workers=OUTBOUND_WORKERS,
+            reserved=OUTBOUND_RESERVED,
+            max_queue=OUTBOUND_QUEUE,
+            bucket_interval=OUTBOUND_INTERVAL,
+        )
+        self.watchdog: LoopWatchdog = LoopWatchdog(threshold=WATCHDOG_THRESHOLD / 1000)
 
         self.active_comics: set[int] = set[int]()
         self.latest_image: Image.Image | None = None
         self.snitch_cache: dict[int, set[int]] = {}
+        # open reaction mode messages {message_id: comic_id}
+        self.reaction_messages: dict[int, int] = {}
 
     @override
     async def setup_hook(self):
+        self.watchdog.start()
         await self.db.connect()
+        self.outbound.start()
         await self.add_cog(AdminCog(self))
         await self.add_cog(GuildCog(self))
         await self.add_cog(PostsCog(self))
         await self.add_cog(InteractCog(self))
         await self.add_cog(VoteCog(self))
+        await self.add_cog(StatsCog(self))
+        await self.add_cog(MaintenanceCog(self))
+        await self.add_cog(ScheduleCog(self))
         self.active_comics.clear()
         self.active_comics.update(await self.db.get_active_comic_ids())
+        self.reaction_messages.clear()
+        for message_id, _, _, comic_id, rating_mode in await self.db.get_active_messages():
+            if RatingMode(rating_mode) == RatingMode.REACTION:
+                self.reaction_messages[message_id] = comic_id
+
+    @override
+    async def close(self):
+        await self.outbound.stop()
+        await self.watchdog.stop()
+        await super().close()
 
     async def on_ready(self):
         logger.info(f"logged in as {self.user}")
+        posts_cog = self.get_cog("PostsCog")
+        if isinstance(posts_cog, PostsCog):
+            await posts_cog.resume_deliveries()
 
 
 class GuildCog(commands.Cog):
@@ -177,6 +233,10 @@ class GuildCog(commands.Cog):
         channel_id = channel.id if channel else None
         if not await self.bot.db.new_guild(guild.id, channel_id):
             logger.critical(f"inserting guild to db failed! {guild.id}")
+        schedule_cog = self.bot.get_cog("ScheduleCog")
+        guild_data = await self.bot.db.get_guild(guild.id)
+        if isinstance(schedule_cog, ScheduleCog) and guild_data:
+            schedule_cog.schedule(guild_data)
         logger.info(f"joined to guild: {guild.name} ({guild.id})")
         if channel:
             await channel.send(
@@ -187,87 +247,331 @@ class GuildCog(commands.Cog):
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild):
         logger.info(f"left guild: {guild.name} ({guild.id})")
+        schedule_cog = self.bot.get_cog("ScheduleCog")
+        if isinstance(schedule_cog, ScheduleCog):
+            schedule_cog.scheduler.remove_guild(guild.id)
+        # its close timer is gone, so the open messages are closed without results
+        messages = await self.bot.db.get_active_messages(guild.id)
+        for row in messages:
+            self.bot.reaction_messages.pop(row[0], None)
+        closed = await self.bot.db.close_messages([row[0] for row in messages])
+        self.bot.active_comics -= closed
 
 
 class PostsCog(commands.Cog):
     def __init__(self, bot: FingerporiBot):
         self.bot: FingerporiBot = bot
-        self.send_to_discord.start()
+        self.scrape_lock: asyncio.Lock = asyncio.Lock()
+        self.last_scrape: datetime | None = None
+        self.resume_lock: asyncio.Lock = asyncio.Lock()
+        # guilds with a post in flight, a resume never posts to them twice
+        self.posting: set[int] = set()
+
+    @staticmethod
+    def build_embed(comic: Comic) -> discord.Embed:
+        source = SOURCES.get(comic.source)
+        embed = discord.Embed(
+            title=f"Päivän {source.name if source else comic.source}",
+            color=discord.Color.light_grey(),
+        )
+        embed.set_image(url=comic.url)
+        embed.set_footer(
+            text=f'{datetime.strptime(comic.date, "%Y-%m-%d").strftime("%d.%m.%Y")}'
+        )
+        return embed
+
+    async def subscribed_sources(self) -> list[str]:
+        """Sources at least one guild wants, only these are scraped"""
+        keys = await self.bot.db.get_subscribed_sources()
+        return sorted(key for key in keys or {DEFAULT_SOURCE} if key in SOURCES)
+
+    async def scrape(self, keys: list[str] | None = None) -> list[Comic]:
+        """Scrapes and stores the latest comics of sources, returns the new ones"""
+        keys = keys if keys is not None else await self.subscribed_sources()
+        results = await scraper.scrape_sources([SOURCES[key] for key in keys])
+        comics: list[Comic] = []
+        failed: list[str] = []
+        for key, data in results.items():
+            if not data:
+                failed.append(key)
+                continue
 
-    @tasks.loop(time=POST_TIME)
-    async def send_to_discord(self):
-        data = await scraper.get_latest_fingerpori()
-        if not data:
-            logger.error("botti rikki :/")
+            img_date, img_url, img_bytes = data["date"], data["url"], data["bytes"]
+            if not isinstance(img_bytes, bytes):
+                logger.error(f"no {key} image downloaded for {img_date}")
+                continue
+
+            img_hash = await asyncio.to_thread(image_hash, img_bytes)
+            if img_hash == await self.bot.db.latest_hash(key):
+                logger.info(f"latest {key} comic is already stored")
+                continue
+            comic = await self.bot.db.save_comic(
+                img_date, img_url, img_bytes, img_hash, key  # pyright: ignore[reportArgumentType]
+            )
+            if comic:
+                self.bot.active_comics.add(comic.id)
+                # journaled before any guild is posted, so a crash can be resumed
+                await self.bot.db.start_deliveries(
+                    comic.id, await self.bot.db.get_subscriber_ids(key)
+                )
+                comics.append(comic)
+
+        if failed:
+            logger.error(f"botti rikki :/ {', '.join(failed)}")
             user: User | None = self.bot.get_user(USER_ID)
             if isinstance(user, User):
-                await user.send("botti rikki :/")
+                await user.send(f"botti rikki :/ ({', '.join(failed)})")
+        return comics
+
+    async def latest_comics(self) -> dict[str, Comic]:
+        """
+        Gets today's comic of every subscribed source, scraping the ones that
+        aren't stored yet in one browser. Guilds firing close together share
+        one scrape, and while HS hasn't published the scrape is retried at
+        most every SCRAPE_RETRY seconds.
+        """
+        async with self.scrape_lock:
+            now = datetime.now(TIMEZONE)
+            today = now.strftime("%Y-%m-%d")
+            keys = await self.subscribed_sources()
+            latest: dict[str, Comic] = {}
+            for key in keys:
+                if comics := await self.bot.db.get_past_n_comics(1, key):
+                    latest[key] = comics[0]
+            missing = [
+                key for key in keys if key not in latest or latest[key].date != today
+            ]
+            if missing and (
+                self.last_scrape is None
+                or (now - self.last_scrape).total_seconds() >= SCRAPE_RETRY
+            ):
+                self.last_scrape = now
+                for comic in await self.scrape(missing):
+                    latest[comic.source] = comic
+            return latest
+
+    async def post_scheduled(self, guild_id: int):
+        guild = await self.bot.db.get_guild(guild_id)
+        if not guild or not guild.channel_id:
+            logger.warning(f"guild {guild_id} has no channel")
             return
-
-        img_date, img_url, img_bytes = data["date"], data["url"], data["bytes"]
-
-        comic = await self.bot.db.save_comic(
-            img_date, img_url, img_bytes  # pyright: ignore[reportArgumentType]
+        latest = await self.latest_comics()
+        comics: list[Comic] = []
+        for source in guild.sources:
+            comic = latest.get(source)
+            if not comic or comic.poll_closed:
+                continue
+            if await self.bot.db.has_message(guild_id, comic.id):
+                logger.debug(f"guild {guild_id} already has comic {comic.id}")
+                continue
+            comics.append(comic)
+        if not comics:
+            logger.info(f"nothing to post for guild {guild_id}")
+            return
+        states = await self.post_to_guild(guild, comics)
+        await self.bot.db.finish_deliveries(
+            [(comic_id, guild_id, state) for comic_id, state in states.items()]
         )
 
-        if not comic:
+    async def send_to_discord(self):
+        """Scrapes and posts new comics to every subscribed guild at once"""
+        comics = await self.scrape()
+
+        if not comics:
             logger.info("skipping comic")
+            await self.resume_deliveries()
             return
 
-        embed = discord.Embed(
-            title="Päivän Fingerpori", color=discord.Color.light_grey()
-        )
-        embed.set_image(url=data["url"])
-        embed.set_footer(
-            text=f'{datetime.strptime(comic.date, "%Y-%m-%d").strftime("%d.%m.%Y")}'
-        )
         guilds = await self.bot.db.get_guilds()
         if not guilds:
             logger.warning("no guilds found")
             return
+        posts: list[tuple[GuildData, list[Comic]]] = []
         for guild in guilds:
-            if not self.bot.get_guild(guild.guild_id):
-                logger.info(f"skipping {guild.guild_id}: bot is no longer a member")
-            channel = self.bot.get_channel(guild.channel_id)
-            if not channel:
-                try:
-                    channel = await self.bot.fetch_channel(guild.channel_id)
-                except (discord.NotFound, discord.Forbidden):
-                    logger.warning(
-                        f"guild {guild.guild_id} channel {guild.channel_id} missing"
-                    )
-                    continue
-            rating_mode = RatingMode(guild.rating_mode)
-
-            if not isinstance(channel, TextChannel):
-                logger.warning(f"{guild.guild_id} channel not found or not messageable")
-                continue
+            wanted = [comic for comic in comics if comic.source in guild.sources]
+            if wanted and guild.channel_id:
+                posts.append((guild, wanted))
+        await self.deliver(posts)
+
+    async def post_to_guild(
+        self, guild: GuildData, comics: list[Comic]
+    ) -> dict[int, DeliveryState]:
+        """
+        Posts comics to a guild, returns the delivery state of each comic id
+
+        With buttons or no rating up to POST_BATCH comics share a message,
+        every comic getting its own embed and button row. Reactions and
+        native polls can't tell comics apart, so those get one message each.
+        """
+        if guild.guild_id in self.posting:
+            logger.info(f"guild {guild.guild_id} is already being posted to")
+            return {}
+        self.posting.add(guild.guild_id)
+        try:
+            return await self.send_comics(guild, comics)
+        finally:
+            self.posting.discard(guild.guild_id)
+
+    async def send_comics(
+        self, guild: GuildData, comics: list[Comic]
+    ) -> dict[int, DeliveryState]:
+        states = {comic.id: DeliveryState.FAILED for comic in comics}
+        if not self.bot.get_guild(guild.guild_id):
+            logger.info(f"skipping {guild.guild_id}: bot is no longer a member")
+        outbound = self.bot.outbound
+        bucket = f"channel:{guild.channel_id}"
+        channel = self.bot.get_channel(guild.channel_id)
+        if not channel:
+            try:
+                channel = await outbound.submit(
+                    Priority.POST,
+                    bucket,
+                    lambda: self.bot.fetch_channel(guild.channel_id),
+                )
+            except (discord.NotFound, discord.Forbidden):
+                logger.warning(
+                    f"guild {guild.guild_id} channel {guild.channel_id} missing"
+                )
+                return states
+            except discord.HTTPException as e:
+                logger.error(f"failed to fetch channel {guild.channel_id}: {e}")
+                return states
+        rating_mode = RatingMode(guild.rating_mode)
+
+        if not isinstance(channel, TextChannel):
+            logger.warning(f"{guild.guild_id} channel not found or not messageable")
+            return states
+
+        size = POST_BATCH if rating_mode in (RatingMode.VIEW, RatingMode.NONE) else 1
+        for start in range(0, len(comics), size):
+            batch = comics[start : start + size]
+            ids = [comic.id for comic in batch]
+            embeds = [self.build_embed(comic) for comic in batch]
+            # discord drops a repeated nonce, so a resend right after a crash is not doubled
+            nonce = f"{ids[0]}-{guild.guild_id}"
             try:
                 if rating_mode == RatingMode.VIEW:
-                    message = await channel.send(embed=embed, view=PostView(comic.id))
+                    message = await outbound.submit(
+                        Priority.POST,
+                        bucket,
+                        lambda: channel.send(
+                            embeds=embeds, view=PostView(*ids), nonce=nonce
+                        ),
+                    )
+                elif rating_mode == RatingMode.POLL:
+                    message = await outbound.submit(
+                        Priority.POST,
+                        bucket,
+                        lambda: channel.send(
+                            embeds=embeds, poll=rating_poll(), nonce=nonce
+                        ),
+                    )
                 else:
-                    message = await channel.send(embed=embed)
+                    message = await outbound.submit(
+                        Priority.POST,
+                        bucket,
+                        lambda: channel.send(embeds=embeds, nonce=nonce),
+                    )
 
                 if not await self.bot.db.new_message(
-                    guild.guild_id, comic.id, message.id, channel.id
+                    guild.guild_id, ids, message.id, channel.id, rating_mode
                 ):
                     logger.error("message insert failed")
-                    await message.delete()
+                    stored: set[int] = set()
+                    for comic_id in ids:
+                        if message_id := await self.bot.db.get_message_id(
+                            guild.guild_id, comic_id
+                        ):
+                            stored.add(message_id)
+                            states[comic_id] = DeliveryState.SENT
+                    # a repeated nonce hands back the post that is already stored
+                    if message.id not in stored:
+                        await outbound.submit(Priority.POST, bucket, message.delete)
+                    continue
+
+                if rating_mode == RatingMode.REACTION:
+                    self.bot.reaction_messages[message.id] = ids[0]
+                    await self.add_reactions(message, bucket)
             except discord.Forbidden:
                 logger.error(f"missing permissions to send in {channel.id}")
+                return states
             except discord.HTTPException as e:
                 logger.error(f"failed to send message: {e}")
-        self.bot.active_comics.add(comic.id)
+                continue
+            for comic_id in ids:
+                states[comic_id] = DeliveryState.SENT
+        return states
 
-    @send_to_discord.before_loop
-    async def before_send_to_discord(self):
-        await self.bot.wait_until_ready()
+    async def add_reactions(self, message: discord.Message, bucket: str):
+        """Adds the rating reactions, the comic is already posted if this fails"""
+        try:
+            for emoji in RATING_EMOJIS:
+                await self.bot.outbound.submit(
+                    Priority.POST,
+                    bucket,
+                    lambda emoji=emoji: message.add_reaction(emoji),
+                )
+        except discord.HTTPException as e:
+            logger.error(f"failed to add rating reactions to {message.id}: {e}")
+
+    async def deliver(self, posts: list[tuple[GuildData, list[Comic]]]):
+        """Posts comics to guilds, journaling outcomes DELIVERY_BATCH at a time"""
+        done: list[tuple[int, int, DeliveryState]] = []
+
+        async def post(guild: GuildData, comics: list[Comic]):
+            states = await self.post_to_guild(guild, comics)
+            done.extend(
+                (comic_id, guild.guild_id, state) for comic_id, state in states.items()
+            )
+            if len(done) >= DELIVERY_BATCH:
+                batch = done.copy()
+                done.clear()
+                await self.bot.db.finish_deliveries(batch)
+
+        await asyncio.gather(*(post(guild, comics) for guild, comics in posts))
+        if done:
+            await self.bot.db.finish_deliveries(done)
+
+    async def resume_deliveries(self):
+        """
+        Finishes deliveries cut short by a crash
+
+        Only pending guilds whose post time has passed since the comic was
+        journaled are posted, the others still have their post timer ahead.
+        Guilds that fired up to SCRAPE_RETRY before the journal count too,
+        their timers set off the scrape or waited for it. Runs one at a time,
+        on_ready fires again after every reconnect.
+        """
+        if self.resume_lock.locked():
+            logger.info("deliveries are already being resumed")
+            return
+        async with self.resume_lock:
+            now = datetime.now(timezone.utc)
+            pending = await self.bot.db.get_pending_deliveries()
+            posts: dict[int, tuple[GuildData, list[Comic]]] = {}
+            for comic_id, guilds in pending.items():
+                comic = await self.bot.db.get_comic(comic_id)
+                if not comic:
+                    continue
+                due = 0
+                for guild, journaled in guilds:
+                    schedule = guild_schedule(guild)
+                    fired = last_fire(
+                        now, schedule.post_time, schedule.tz, schedule.offset
+                    )
+                    if fired < journaled - timedelta(seconds=SCRAPE_RETRY):
+                        continue
+                    due += 1
+                    posts.setdefault(guild.guild_id, (guild, []))[1].append(comic)
+                logger.info(
+                    f"resuming comic {comic_id} for {due} of {len(guilds)} guilds"
+                )
+            await self.deliver(list(posts.values()))
 
 
 class VoteCog(commands.Cog):
     def __init__(self, bot: "FingerporiBot"):
         self.bot: FingerporiBot = bot
-        self.close_polls.start()
 
     @commands.Cog.listener()
     async def on_interaction(self, interaction: discord.Interaction):
@@ -293,84 +597,226 @@ class VoteCog(commands.Cog):
         view = discord.ui.View.from_message(interaction.message)
         for item in view.children:
             if isinstance(item, discord.ui.Button) and item.custom_id:
-                rating = int(item.custom_id.split(":")[2])
+                _, button_comic, rating = item.custom_id.split(":")
+                if int(button_comic) != comic_id:
+                    continue
+                rating = int(rating)
                 localvotes, globalvotes = votes.get( # pyright: ignore[reportUnusedVariable]
                     rating, (0, 0)
                 )  
                 item.label = f"{localvotes}"
                 # item.label = f"{localvotes} ({globalvotes})"
-        await interaction.response.edit_message(view=view)
-
-    @tasks.loop(time=SUB_TIME)
-    async def close_polls(self):
-        messages = await self.bot.db.get_active_messages()
-        closed: set[int] = set()
-
-        for row in messages:
-            message_id, channel_id, guild_id, comic_id, rating_mode = row
-            rating_mode = RatingMode(rating_mode)
-            if rating_mode == RatingMode.NONE:
-                continue
-
-            votes = await self.bot.db.get_votes(guild_id, comic_id)
+        await self.bot.outbound.submit(
+            Priority.INTERACTION,
+            "interaction",
+            lambda: interaction.response.edit_message(view=view),
+        )
 
-            local_sum = 0
-            local_count = 0
-            global_sum = 0
-            global_count = 0
-            for score, (local, glob) in votes.items():
-                local_sum += score * local
-                local_count += local
-                global_sum += score * glob
-                global_count += glob
-            local_avg = local_sum / local_count if local_count > 0 else 0
-            global_avg = global_sum / global_count if global_count > 0 else 0
+    def reaction_vote(
+        self, payload: discord.RawReactionActionEvent
+    ) -> tuple[int, int] | None:
+        """Maps a raw reaction event to (comic_id, rating) without fetching anything"""
+        if self.bot.user and payload.user_id == self.bot.user.id:
+            return None
+        comic_id = self.bot.reaction_messages.get(payload.message_id)
+        if comic_id is None or comic_id not in self.bot.active_comics:
+            return None
+        rating = RATING_EMOJIS.get(str(payload.emoji))
+        if rating is None:
+            return None
+        return comic_id, rating
 
-            try:
-                channel = self.bot.get_channel(
-                    channel_id
-                ) or await self.bot.fetch_channel(channel_id)
-                if not isinstance(channel, discord.TextChannel):
-                    continue
-                message = await channel.fetch_message(message_id)
-                if not isinstance(message, discord.Message):
-                    continue
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        vote = self.reaction_vote(payload)
+        if not vote:
+            return
+        comic_id, rating = vote
+        await self.bot.db.save_vote(comic_id, payload.user_id, rating, payload.message_id)
 
-                view = discord.ui.View.from_message(message)
-                for item in view.children:
-                    if isinstance(item, discord.ui.Button) and item.custom_id:
-                        item.disabled = True
-                        item.style = discord.ButtonStyle.grey
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        # only removes the vote if the removed emoji is the user's current rating,
+        # switching 3 -> 4 and then dropping the 3 keeps the 4
+        vote = self.reaction_vote(payload)
+        if not vote:
+            return
+        comic_id, rating = vote
+        await self.bot.db.remove_vote(comic_id, payload.user_id, rating)
+
+    async def close_rows(
+        self, rows: list[tuple[int, int, int, int, int]]
+    ) -> list[int | None]:
+        """
+        Closes messages, native polls first so their counts are in the global averages
+
+        The ordering only helps within one call, like /closepolls closing every
+        guild. Guilds closed earlier by their own timers show global averages
+        without the polls that close after them. Rows of comics posted
+        together are closed as one message. Returns the
+        comic id of each row that got closed, None for the others.
+        """
+        messages: dict[int, list[tuple[int, int, int, int, int]]] = {}
+        for row in rows:
+            messages.setdefault(row[0], []).append(row)
+        polls = [group for group in messages.values() if group[0][4] == RatingMode.POLL]
+        others = [group for group in messages.values() if group[0][4] != RatingMode.POLL]
+        closed: dict[int, bool] = {}
+        for groups in (polls, others):
+            results = await asyncio.gather(
+                *(self.close_message(group) for group in groups)
+            )
+            closed.update(
+                (group[0][0], result) for group, result in zip(groups, results)
+            )
+        return [row[3] if closed[row[0]] else None for row in rows]
 
-                        rating = int(item.custom_id.split(":")[2])
-                        localvotes, globalvotes = votes.get(rating, (0, 0))
-                        item.label = f"{localvotes}   ({globalvotes})"
+    async def close_polls(self):
+        """Closes every open poll of every guild"""
+        messages = await self.bot.db.get_active_messages()
+        results = await self.close_rows(messages)
+        closed: set[int] = {comic_id for comic_id in results if comic_id is not None}
+        await self.bot.db.close_polls(closed)
+        self.bot.active_comics -= closed
 
-                guild_name = message.guild.name if message.guild else "guild"
+    async def close_guild(self, guild_id: int):
+        messages = await self.bot.db.get_active_messages(guild_id)
+        results = await self.close_rows(messages)
+        message_ids = [
+            row[0] for row, comic_id in zip(messages, results) if comic_id is not None
+        ]
+        closed = await self.bot.db.close_messages(message_ids)
+        self.bot.active_comics -= closed
 
-                embed = message.embeds[0].copy()
-                embed2 = discord.Embed(
-                    title="Tulokset", color=discord.Color.light_grey()
+    async def ingest_poll(
+        self, message: discord.Message, guild_id: int, comic_id: int
+    ) -> discord.Message:
+        """Ends a native poll and stores its answer counts, returns the updated message"""
+        outbound = self.bot.outbound
+        bucket = f"channel:{message.channel.id}"
+        poll = message.poll
+        if poll is None:
+            return message
+        if not poll.is_finalised():
+            try:
+                message = await outbound.submit(Priority.CLOSE, bucket, message.end_poll)
+            except discord.HTTPException as e:
+                # already expired on its own, the counts are still there
+                logger.warning(f"failed to end poll {message.id}: {e}")
+            poll = message.poll
+            if poll and not poll.is_finalised():
+                # discord tallies the final counts asynchronously
+                await asyncio.sleep(POLL_FINALISE_WAIT)
+                message = await outbound.submit(
+                    Priority.CLOSE,
+                    bucket,
+                    lambda: message.channel.fetch_message(message.id),
                 )
+                poll = message.poll
+        if poll is None:
+            return message
+        counts = {
+            answer.id: answer.vote_count
+            for answer in poll.answers
+            if answer.id in RATING_EMOJIS.values()
+        }
+        await self.bot.db.save_poll_results(message.id, guild_id, comic_id, counts)
+        return message
+
+    async def close_message(self, rows: list[tuple[int, int, int, int, int]]) -> bool:
+        """
+        Disables the buttons of a poll message and adds results
+
+        Args:
+            rows: The message's rows from get_active_messages, one per comic
+
+        Returns:
+            Whether the message's comics count as closed
+        """
+        message_id, channel_id, guild_id, _, rating_mode = rows[0]
+        comic_ids = [row[3] for row in rows]
+        rating_mode = RatingMode(rating_mode)
+        if rating_mode == RatingMode.NONE:
+            # nothing to edit, but its comic only closes once every message has
+            return True
+        self.bot.reaction_messages.pop(message_id, None)
+
+        outbound = self.bot.outbound
+        bucket = f"channel:{channel_id}"
+        try:
+            channel = self.bot.get_channel(channel_id) or await outbound.submit(
+                Priority.CLOSE, bucket, lambda: self.bot.fetch_channel(channel_id)
+            )
+            if not isinstance(channel, discord.TextChannel):
+                return False
+            message = await outbound.submit(
+                Priority.CLOSE, bucket, lambda: channel.fetch_message(message_id)
+            )
+            if not isinstance(message, discord.Message):
+                return False
+            if rating_mode == RatingMode.POLL:
+                message = await self.ingest_poll(message, guild_id, comic_ids[0])
+
+            votes = {
+                comic_id: await self.bot.db.get_votes(guild_id, comic_id)
+                for comic_id in comic_ids
+            }
+
+            view = discord.ui.View.from_message(message)
+            for item in view.children:
+                if isinstance(item, discord.ui.Button) and item.custom_id:
+                    item.disabled = True
+                    item.style = discord.ButtonStyle.grey
+
+                    _, comic_id, rating = item.custom_id.split(":")
+                    localvotes, globalvotes = votes.get(int(comic_id), {}).get(
+                        int(rating), (0, 0)
+                    )
+                    item.label = f"{localvotes}   ({globalvotes})"
+
+            guild_name = message.guild.name if message.guild else "guild"
+
+            embeds = [embed.copy() for embed in message.embeds]
+            embed2 = discord.Embed(title="Tulokset", color=discord.Color.light_grey())
+            for comic_id in comic_ids:
+                local_sum = 0
+                local_count = 0
+                global_sum = 0
+                global_count = 0
+                for score, (local, glob) in votes[comic_id].items():
+                    local_sum += score * local
+                    local_count += local
+                    global_sum += score * glob
+                    global_count += glob
+                local_avg = local_sum / local_count if local_count > 0 else 0
+                global_avg = global_sum / global_count if global_count > 0 else 0
+
+                prefix = ""
+                if len(comic_ids) > 1:
+                    comic = await self.bot.db.get_comic(comic_id)
+                    source = SOURCES.get(comic.source) if comic else None
+                    prefix = f"{source.name if source else comic_id}: "
                 embed2.add_field(
-                    name=guild_name, value=f"📍 **{local_avg:.1f}**", inline=True
+                    name=f"{prefix}{guild_name}",
+                    value=f"📍 **{local_avg:.1f}**",
+                    inline=True,
                 )
                 embed2.add_field(
-                    name="Kaikki servut", value=f"🇫🇮 **{global_avg:.1f}**", inline=True
+                    name=f"{prefix}Kaikki servut",
+                    value=f"🇫🇮 **{global_avg:.1f}**",
+                    inline=True,
                 )
 
-                await message.edit(embeds=[embed, embed2], view=view)
-            except discord.NotFound:
-                logger.warning(f"message {message_id} not found")
-            except Exception as e:
-                logger.warning(f"failed to close poll for {message_id}: {e}")
-            closed.add(comic_id)
-        await self.bot.db.close_polls(closed)
-        self.bot.active_comics -= closed
-
-    @close_polls.before_loop
-    async def before_loop(self):
-        await self.bot.wait_until_ready()
+            await outbound.submit(
+                Priority.CLOSE,
+                bucket,
+                lambda: message.edit(embeds=[*embeds, embed2], view=view),
+            )
+        except discord.NotFound:
+            logger.warning(f"message {message_id} not found")
+        except Exception as e:
+            logger.warning(f"failed to close poll for {message_id}: {e}")
+        return True
 
 
 class InteractCog(commands.Cog):
@@ -467,6 +913,176 @@ class InteractCog(commands.Cog):
         await interaction.followup.send(content=content, ephemeral=True)
 
 
+class StatsCog(commands.Cog):
+    def __init__(self, bot: "FingerporiBot"):
+        self.bot: FingerporiBot = bot
+
+    @staticmethod
+    def format_scores(scores: list[ComicScore]) -> str:
+        lines: list[str] = []
+        for score in scores:
+            date = datetime.strptime(score.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+            if score.source != DEFAULT_SOURCE:
+                source = SOURCES.get(score.source)
+                date = f"{source.name if source else score.source} {date}"
+            lines.append(f"**{score.average:.2f}**  {date}  ({score.votes} ääntä)")
+        return "\n".join(lines)
+
+    @app_commands.command(name="parhaat", description="kaikkien aikojen parhaat")
+    @app_commands.describe(kaikki="kaikkien servujen äänet", maara="montako")
+    async def top(
+        self,
+        interaction: discord.Interaction,
+        kaikki: bool = False,
+        maara: app_commands.Range[int, 1, 25] = 10,
+    ):
+        if not interaction.guild_id:
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        scores = await self.bot.db.get_top_comics(
+            maara, None if kaikki else interaction.guild_id
+        )
+        if not scores:
+            await interaction.followup.send("Tämähän on tyhjää täynnä")
+            return
+
+        title = "Kaikki servut" if kaikki else "Parhaat"
+        await interaction.followup.send(
+            f"### {title}: \n\n{self.format_scores(scores)}"
+        )
+
+    @app_commands.command(name="historia", description="servun viimeisimmät arvosanat")
+    @app_commands.describe(maara="montako")
+    async def history(
+        self,
+        interaction: discord.Interaction,
+        maara: app_commands.Range[int, 1, 25] = 10,
+    ):
+        if not interaction.guild_id:
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        scores = await self.bot.db.get_guild_history(interaction.guild_id, maara)
+        if not scores:
+            await interaction.followup.send("Tämähän on tyhjää täynnä")
+            return
+
+        votes = sum(score.votes for score in scores)
+        average = sum(score.average * score.votes for score in scores) / votes
+        await interaction.followup.send(
+            f"### Historia: \n\n{self.format_scores(scores)}\n\nKeskiarvo **{average:.2f}**"
+        )
+
+
+class MaintenanceCog(commands.Cog):
+    def __init__(self, bot: "FingerporiBot"):
+        self.bot: FingerporiBot = bot
+        self.maintenance.start()
+
+    @tasks.loop(time=MAINTENANCE_TIME)
+    async def maintenance(self):
+        if VOTE_RETENTION_DAYS >= 0:
+            comic_ids = await self.bot.db.get_prunable_comic_ids(VOTE_RETENTION_DAYS)
+            if comic_ids and VOTE_ARCHIVE_PATH:
+                os.makedirs(VOTE_ARCHIVE_PATH, exist_ok=True)
+                path = os.path.join(
+                    VOTE_ARCHIVE_PATH,
+                    f"votes-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz",
+                )
+                placeholder = ", ".join(["?"] * len(comic_ids))
+                try:
+                    count = await export.export_query(
+                        self.bot.db.connection,
+                        f"SELECT * FROM vote WHERE comic_id IN ({placeholder})",
+                        comic_ids,
+                        path,
+                    )
+                    logger.info(f"archived {count} votes to {path}")
+                except Exception as e:
+                    logger.error(f"archiving votes failed, not pruning: {e}")
+                    comic_ids = []
+            if comic_ids:
+                pruned = await self.bot.db.prune_votes(comic_ids)
+                logger.info(f"pruned {pruned} votes of {len(comic_ids)} comics")
+
+        before, after = await self.bot.db.incremental_vacuum(VACUUM_PAGES)
+        logger.info(f"incremental vacuum freed {before - after} pages, {after} left")
+
+    @maintenance.before_loop
+    async def before_maintenance(self):
+        await self.bot.wait_until_ready()
+
+
+class ScheduleCog(commands.Cog):
+    def __init__(self, bot: "FingerporiBot"):
+        self.bot: FingerporiBot = bot
+        self.scheduler: GuildScheduler = GuildScheduler(self.fire, CLOSE_BEFORE)
+
+    @override
+    async def cog_load(self):
+        for guild in await self.bot.db.get_guilds() or []:
+            self.schedule(guild)
+        self.scheduler.start()
+
+    @override
+    async def cog_unload(self):
+        await self.scheduler.stop()
+
+    def schedule(self, guild: GuildData):
+        self.scheduler.schedule_guild(guild.guild_id, guild_schedule(guild))
+
+    async def fire(self, kind: TimerKind, guild_id: int):
+        await self.bot.wait_until_ready()
+        if kind == TimerKind.CLOSE:
+            vote_cog = self.bot.get_cog("VoteCog")
+            if isinstance(vote_cog, VoteCog):
+                await vote_cog.close_guild(guild_id)
+        else:
+            posts_cog = self.bot.get_cog("PostsCog")
+            if isinstance(posts_cog, PostsCog):
+                await posts_cog.post_scheduled(guild_id)
+
+    @app_commands.command(name="set_time", description="set daily post time")
+    @app_commands.describe(aika="HH:MM", vyohyke="esim. Europe/Helsinki")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_time(
+        self, interaction: discord.Interaction, aika: str, vyohyke: str | None = None
+    ):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            return
+        try:
+            post_time = time.fromisoformat(aika)
+            tz = zoneinfo.ZoneInfo(vyohyke) if vyohyke else TIMEZONE
+        except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+            await interaction.response.send_message(
+                "Anna aika muodossa HH:MM ja vyöhyke esim. Europe/Helsinki",
+                ephemeral=True,
+            )
+            return
+
+        post_time_str = post_time.strftime("%H:%M")
+        if not await self.bot.db.set_post_time(guild_id, post_time_str, vyohyke):
+            await interaction.response.send_message("Servua ei löydy", ephemeral=True)
+            return
+        guild = await self.bot.db.get_guild(guild_id)
+        if guild:
+            self.schedule(guild)
+
+        next_post = self.scheduler.next_runs(guild_id).get(TimerKind.POST)
+        when = (
+            discord.utils.format_dt(next_post, "F") if next_post else post_time_str
+        )
+        await interaction.response.send_message(
+            f"Fingerpori tulee {post_time_str} ({tz.key}), seuraavan kerran {when}"
+        )
+        logger.info(f"post time for guild {guild_id} set to {post_time_str} {tz.key}")
+
+
 class AdminCog(commands.Cog):
     def __init__(self, bot: "FingerporiBot"):
         self.bot: FingerporiBot = bot
@@ -492,6 +1108,69 @@ class AdminCog(commands.Cog):
         )
         logger.info(f"Update channel for guild {guild_id} set to #{channel_id}.")
 
+    @app_commands.command(
+        name="set_rating", description="set how comics are rated in this server"
+    )
+    @app_commands.choices(
+        tila=[
+            app_commands.Choice(name="ei arvostelua", value=RatingMode.NONE.value),
+            app_commands.Choice(name="napit", value=RatingMode.VIEW.value),
+            app_commands.Choice(name="reaktiot", value=RatingMode.REACTION.value),
+            app_commands.Choice(name="kysely", value=RatingMode.POLL.value),
+        ]
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_rating(
+        self, interaction: discord.Interaction, tila: app_commands.Choice[int]
+    ):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            return
+        if not await self.bot.db.set_rating_mode(guild_id, tila.value):
+            await interaction.response.send_message("Servua ei löydy", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"Arvostelu vaihdettu: {tila.name}. Vaihtuu seuraavasta fingerporista"
+        )
+        logger.info(f"rating mode for guild {guild_id} set to {RatingMode(tila.value).name}")
+
+    @app_commands.command(
+        name="set_source", description="subscribe this server to a comic"
+    )
+    @app_commands.choices(
+        sarjakuva=[
+            app_commands.Choice(name=source.name, value=source.key)
+            for source in SOURCES.values()
+        ]
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_source(
+        self,
+        interaction: discord.Interaction,
+        sarjakuva: app_commands.Choice[str],
+        tilaa: bool = True,
+    ):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            return
+        result = await self.bot.db.set_subscription(guild_id, sarjakuva.value, tilaa)
+        if result is None:
+            await interaction.response.send_message("Servua ei löydy", ephemeral=True)
+            return
+        if not result:
+            await interaction.response.send_message(
+                "Viimeistä sarjakuvaa ei voi perua, tilaa ensin toinen", ephemeral=True
+            )
+            return
+        await interaction.response.send_message(
+            f"{sarjakuva.name} {'tilattu' if tilaa else 'peruttu'}. Vaihtuu seuraavasta postauksesta"
+        )
+        logger.info(
+            f"guild {guild_id} {'subscribed to' if tilaa else 'unsubscribed from'} {sarjakuva.value}"
+        )
+
     @commands.command(hidden=True)
     @commands.dm_only()
     @commands.is_owner()
@@ -514,6 +1193,28 @@ class AdminCog(commands.Cog):
         except Exception as e:
             await ctx.send(f"error syncing {e}")
 
+    @commands.command(hidden=True)
+    @commands.dm_only()
+    @commands.is_owner()
+    async def export(self, ctx: commands.Context[FingerporiBot], fmt: str = "csv"):
+        if fmt not in export.FORMATS:
+            await ctx.send(f"format must be one of {', '.join(export.FORMATS)}")
+            return
+        await ctx.send("Export started")
+        try:
+            paths = await export.export_tables(self.bot.db.db, fmt=fmt)
+        except Exception as e:
+            logger.error(f"export failed: {e}")
+            await ctx.send(f"error exporting {e}")
+            return
+
+        for path in paths:
+            if os.path.getsize(path) > discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES:
+                await ctx.send(f"{path} is too big to send, it is on the server")
+                continue
+            await ctx.send(file=discord.File(path))
+        await ctx.send("export done")
+
     @commands.command(hidden=True)
     @commands.dm_only()
     @commands.is_owner()
@@ -526,8 +1227,46 @@ class AdminCog(commands.Cog):
         else:
             await ctx.send("error: VoteCog not loaded")
 
+    @commands.command(hidden=True)
+    @commands.dm_only()
+    @commands.is_owner()
+    async def queues(self, ctx: commands.Context[FingerporiBot]):
+        lines = [
+            f"{name}: {stats['queued']} queued, {stats['in_flight']} in flight, "
+            f"{stats['completed']} done, max {stats['max_queued']}"
+            for name, stats in self.bot.outbound.stats().items()
+        ]
+        await ctx.send("\n".join(lines))
+
+    @commands.command(hidden=True)
+    @commands.dm_only()
+    @commands.is_owner()
+    async def lag(self, ctx: commands.Context[FingerporiBot]):
+        stats = self.bot.watchdog.stats()
+        await ctx.send(
+            f"event loop lag p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, "
+            f"max {stats['max_ms']:.0f} ms over {stats['samples']} samples\n"
+            f"{stats['stalls']} stalls over {WATCHDOG_THRESHOLD} ms"
+        )
+        if self.bot.watchdog.last_stack:
+            stack = self.bot.watchdog.last_stack[-1900:]
+            await ctx.send(f"last stall:\n```{stack}```")
+
+    @commands.command(hidden=True)
+    @commands.dm_only()
+    @commands.is_owner()
+    async def maintenance(self, ctx: commands.Context[FingerporiBot]):
+        maintenance_cog = self.bot.get_cog("MaintenanceCog")
+        if isinstance(maintenance_cog, MaintenanceCog):
+            await ctx.send("Running maintenance")
+            await maintenance_cog.maintenance()
+            await ctx.send("Maintenance done")
+        else:
+            await ctx.send("error: MaintenanceCog not loaded")
+
 
 if __name__ == "__main__":
     db = DbManager()
     bot = FingerporiBot(db=db)
-    bot.run(TOKEN)
+    # logging is already set up, don't let discord.py add its own handler
+    bot.run(TOKEN, log_handler=None)
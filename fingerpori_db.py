@@ -1,9 +1,11 @@
 import io
 import logging
 import os
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
 from enum import IntEnum
-from typing import override
+from typing import Generic, TypeVar, override
 
 import aiosqlite
 import imagehash
@@ -13,10 +15,15 @@ from PIL import Image
 logger = logging.getLogger("fingerpori_db")
 
 
+# source key of comics and subscriptions from before there were several strips
+DEFAULT_SOURCE = "fingerpori"
+
+
 class RatingMode(IntEnum):
     NONE = 0
     VIEW = 1
-    SNOOP = 2
+    REACTION = 2
+    POLL = 3
 
     @classmethod
     @override
@@ -24,6 +31,12 @@ class RatingMode(IntEnum):
         return cls.VIEW
 
 
+class DeliveryState(IntEnum):
+    PENDING = 0
+    SENT = 1
+    FAILED = 2
+
+
 @dataclass
 class Comic:
     id: int
@@ -33,6 +46,7 @@ class Comic:
     path: str
     content: bytes = b""
     poll_closed: bool = False
+    source: str = DEFAULT_SOURCE
 
 
 @dataclass
@@ -43,11 +57,96 @@ class ComicMessage:
     channel_id: int
 
 
+@dataclass
+class ComicScore:
+    comic_id: int
+    date: str
+    votes: int
+    average: float
+    source: str = DEFAULT_SOURCE
+
+
 @dataclass
 class GuildData:
     guild_id: int
     channel_id: int
     rating_mode: RatingMode
+    post_time: str | None = None
+    timezone: str | None = None
+    sources: tuple[str, ...] = (DEFAULT_SOURCE,)
+
+
+GUILD_QUERY = """
+    SELECT guild_id, channel_id, rating_mode, post_time, timezone, (
+        SELECT group_concat(source) FROM subscription
+        WHERE subscription.guild_id = guild.guild_id
+    ) FROM guild"""
+
+
+def guild_from_row(row: aiosqlite.Row) -> GuildData:
+    """Builds GuildData from a GUILD_QUERY row, no subscriptions means the default source"""
+    return GuildData(
+        guild_id=row[0],
+        channel_id=row[1],
+        rating_mode=RatingMode(row[2]),
+        post_time=row[3],
+        timezone=row[4],
+        sources=tuple(sorted(row[5].split(","))) if row[5] else (DEFAULT_SOURCE,),
+    )
+
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LruCache(Generic[K, V]):
+    """
+    Bounded mapping that drops the least recently used entry when full
+
+    A value read from sqlite across awaits can go stale before it is put.
+    Readers take generation(key) before the read and pass it to put(),
+    which drops the value if the key was popped or the cache cleared since.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._epoch: int = 0
+        self._generations: dict[K, int] = {}
+
+    def get(self, key: K) -> V | None:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self, key: K) -> tuple[int, int]:
+        return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key: K, value: V, generation: tuple[int, int] | None = None):
+        if generation is not None and generation != self.generation(key):
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K):
+        self._data.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        self._data.clear()
+        self._generations.clear()
+        self._epoch += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 if not load_dotenv():
@@ -57,14 +156,40 @@ DB = os.getenv("DB") or "fpori.db"
 IMAGE_PATH = "images/"
 
 
+def image_hash(content: bytes) -> str:
+    """Perceptual hash of a comic image, stored in comic.hash"""
+    with Image.open(io.BytesIO(content)) as img:
+        return str(imagehash.phash(img))
+
+
 class DbManager:
-    def __init__(self):
-        self.db: str = DB
+    """
+    Comics, guild configs and the latest comics are cached in memory and
+    served without touching sqlite. Every write through DbManager that
+    changes them drops the affected entries, so anything writing those
+    tables behind its back has to call clear_cache(). Cached objects are
+    handed out as copies.
+    """
+
+    def __init__(self, db: str = DB, cache_size: int = 1024):
+        self.db: str = db
         self.conn: aiosqlite.Connection | None = None
+        self.comic_cache: LruCache[int, Comic] = LruCache(cache_size)
+        self.guild_cache: LruCache[int, GuildData] = LruCache(cache_size)
+        # get_past_n_comics results by (source, count)
+        self.latest_cache: LruCache[tuple[str, int], list[Comic]] = LruCache(64)
+        self._all_guilds: list[GuildData] | None = None
+        self._subscribed: set[str] | None = None
+        # bumped whenever _all_guilds and _subscribed are dropped, like
+        # LruCache.generation()
+        self._guilds_generation: int = 0
 
     async def connect(self):
         self.conn = await aiosqlite.connect(self.db)
         await self.conn.execute("PRAGMA foreign_keys = ON")
+        await self._enable_incremental_vacuum()
+        # readers like fingerpori_export get a snapshot without blocking writes
+        await self.conn.execute("PRAGMA journal_mode = WAL")
         self.conn.row_factory = aiosqlite.Row
         await self._create_tables()
         return self
@@ -75,18 +200,61 @@ class DbManager:
             raise RuntimeError("DbManager.connect() was never called")
         return self.conn
 
+    def clear_cache(self):
+        self.comic_cache.clear()
+        self.guild_cache.clear()
+        self.latest_cache.clear()
+        self._all_guilds = None
+        self._subscribed = None
+        self._guilds_generation += 1
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        return {
+            name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+            for name, cache in (
+                ("comic", self.comic_cache),
+                ("guild", self.guild_cache),
+                ("latest", self.latest_cache),
+            )
+        }
+
+    def _forget_guild(self, guild_id: int):
+        self.guild_cache.pop(guild_id)
+        self._all_guilds = None
+        self._subscribed = None
+        self._guilds_generation += 1
+
+    def _forget_comics(self, comic_ids: set[int]):
+        for comic_id in comic_ids:
+            self.comic_cache.pop(comic_id)
+        self.latest_cache.clear()
+
+    async def _enable_incremental_vacuum(self):
+        async with self.connection.cursor() as cursor:
+            await cursor.execute("PRAGMA auto_vacuum")
+            row = await cursor.fetchone()
+            if row and row[0] == 2:
+                return
+            # changing auto_vacuum on an existing db needs a full vacuum once
+            await cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await cursor.execute("VACUUM")
+            logger.info("db switched to incremental auto vacuum")
+
     async def _create_tables(self):
         async with self.connection.cursor() as cursor:
             await cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS comic (
                     comic_id INTEGER PRIMARY KEY,
-                    date TEXT UNIQUE NOT NULL,
-                    hash TEXT UNIQUE NOT NULL,
+                    date TEXT NOT NULL,
+                    hash TEXT NOT NULL,
                     url TEXT NOT NULL,
                     path TEXT NOT NULL,
                     poll_closed INTEGER DEFAULT 0,
-                    scraped_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    scraped_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    source TEXT NOT NULL DEFAULT 'fingerpori',
+                    UNIQUE (source, date),
+                    UNIQUE (source, hash)
                     )
             """
             )
@@ -95,7 +263,9 @@ class DbManager:
                 CREATE TABLE IF NOT EXISTS guild (
                     guild_id INTEGER PRIMARY KEY,
                     channel_id INTEGER,
-                    rating_mode INTEGER DEFAULT 1 CHECK (rating_mode BETWEEN 0 AND 3) -- 0 = none, 1 = view, 2 = reaction, 3 = poll
+                    rating_mode INTEGER DEFAULT 1 CHECK (rating_mode BETWEEN 0 AND 3), -- 0 = none, 1 = view, 2 = reaction, 3 = poll
+                    post_time TEXT, -- HH:MM, NULL = POST_TIME
+                    timezone TEXT -- NULL = Europe/Helsinki
                     )
             """
             )
@@ -104,9 +274,11 @@ class DbManager:
                 CREATE TABLE IF NOT EXISTS message (
                     guild_id INTEGER,
                     comic_id INTEGER,
-                    message_id INTEGER UNIQUE NOT NULL,
+                    message_id INTEGER NOT NULL, -- shared by the comics posted together
                     channel_id INTEGER NOT NULL,
                     sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    poll_closed INTEGER DEFAULT 0,
+                    rating_mode INTEGER, -- RatingMode the message was posted with
                     PRIMARY KEY (guild_id, comic_id),
                     FOREIGN KEY (guild_id) REFERENCES guild(guild_id),
                     FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
@@ -122,13 +294,287 @@ class DbManager:
                     message_id INTEGER NOT NULL,
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (comic_id, user_id),
-                    FOREIGN KEY (comic_id) REFERENCES comic(comic_id),
-                    FOREIGN KEY (message_id) REFERENCES message(message_id)
+                    FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
                 )
             """
             )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS delivery (
+                    comic_id INTEGER,
+                    guild_id INTEGER,
+                    state INTEGER DEFAULT 0 CHECK (state BETWEEN 0 AND 2), -- 0 = pending, 1 = sent, 2 = failed
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (comic_id, guild_id),
+                    FOREIGN KEY (comic_id) REFERENCES comic(comic_id),
+                    FOREIGN KEY (guild_id) REFERENCES guild(guild_id)
+                    )
+            """
+            )
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS delivery_pending ON delivery (comic_id) WHERE state = 0"
+            )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS poll_result (
+                    message_id INTEGER,
+                    guild_id INTEGER NOT NULL,
+                    comic_id INTEGER NOT NULL,
+                    rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
+                    votes INTEGER NOT NULL,
+                    PRIMARY KEY (message_id, rating),
+                    FOREIGN KEY (guild_id) REFERENCES guild(guild_id),
+                    FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
+                    )
+            """
+            )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS webhook (
+                    webhook_id INTEGER PRIMARY KEY,
+                    url TEXT UNIQUE NOT NULL,
+                    active INTEGER DEFAULT 1,
+                    added_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+            """
+            )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS webhook_delivery (
+                    comic_id INTEGER,
+                    webhook_id INTEGER,
+                    state INTEGER DEFAULT 0 CHECK (state BETWEEN 0 AND 2), -- same as delivery
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (comic_id, webhook_id),
+                    FOREIGN KEY (comic_id) REFERENCES comic(comic_id),
+                    FOREIGN KEY (webhook_id) REFERENCES webhook(webhook_id)
+                    )
+            """
+            )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS subscription (
+                    guild_id INTEGER,
+                    source TEXT,
+                    PRIMARY KEY (guild_id, source),
+                    FOREIGN KEY (guild_id) REFERENCES guild(guild_id)
+                    )
+            """
+            )
+            await self._add_missing_columns(cursor)
+            await self._create_score_tables(cursor)
             await self.connection.commit()
 
+    async def _add_missing_columns(self, cursor: aiosqlite.Cursor):
+        """Brings tables created by older versions up to date"""
+        await cursor.execute("PRAGMA table_info(guild)")
+        guild_columns = {row[1] for row in await cursor.fetchall()}
+        if "post_time" not in guild_columns:
+            await cursor.execute("ALTER TABLE guild ADD COLUMN post_time TEXT")
+        if "timezone" not in guild_columns:
+            await cursor.execute("ALTER TABLE guild ADD COLUMN timezone TEXT")
+
+        await cursor.execute("PRAGMA table_info(message)")
+        message_columns = {row[1] for row in await cursor.fetchall()}
+        if "poll_closed" not in message_columns:
+            await cursor.execute(
+                "ALTER TABLE message ADD COLUMN poll_closed INTEGER DEFAULT 0"
+            )
+            await cursor.execute(
+                """
+                UPDATE message SET poll_closed = 1
+                WHERE comic_id IN (SELECT comic_id FROM comic WHERE poll_closed = 1)
+                """
+            )
+            logger.info("added poll_closed to message")
+
+        await cursor.execute("PRAGMA table_info(comic)")
+        if "source" not in {row[1] for row in await cursor.fetchall()}:
+            await self._rebuild_for_sources()
+
+        # after the rebuild, which copies message without it
+        await cursor.execute("PRAGMA table_info(message)")
+        if "rating_mode" not in {row[1] for row in await cursor.fetchall()}:
+            await cursor.execute("ALTER TABLE message ADD COLUMN rating_mode INTEGER")
+            # the guild's current mode is the best guess for messages already sent
+            await cursor.execute(
+                """
+                UPDATE message SET rating_mode = (
+                    SELECT rating_mode FROM guild WHERE guild.guild_id = message.guild_id
+                )
+                """
+            )
+            logger.info("added rating_mode to message")
+
+        await cursor.execute(
+            "CREATE INDEX IF NOT EXISTS message_open ON message (poll_closed, guild_id)"
+        )
+        await cursor.execute(
+            "CREATE INDEX IF NOT EXISTS message_by_id ON message (message_id)"
+        )
+
+    async def _rebuild_for_sources(self):
+        """
+        Rebuilds comic, message and vote for several strips
+
+        comic.date and message.message_id lose their UNIQUE constraints and
+        vote its foreign key to message.message_id, which needed it. sqlite
+        can't drop constraints, so the tables are copied into new ones in a
+        single transaction. The vote triggers join message, so they are
+        dropped first and created again by _create_score_tables.
+        """
+        await self.connection.executescript(
+            """
+            PRAGMA foreign_keys = OFF;
+            BEGIN;
+            DROP TRIGGER IF EXISTS vote_score_insert;
+            DROP TRIGGER IF EXISTS vote_score_update;
+            CREATE TABLE comic_new (
+                comic_id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                url TEXT NOT NULL,
+                path TEXT NOT NULL,
+                poll_closed INTEGER DEFAULT 0,
+                scraped_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                source TEXT NOT NULL DEFAULT 'fingerpori',
+                UNIQUE (source, date),
+                UNIQUE (source, hash)
+                );
+            INSERT INTO comic_new (comic_id, date, hash, url, path, poll_closed, scraped_at)
+            SELECT comic_id, date, hash, url, path, poll_closed, scraped_at FROM comic;
+            DROP TABLE comic;
+            ALTER TABLE comic_new RENAME TO comic;
+
+            CREATE TABLE message_new (
+                guild_id INTEGER,
+                comic_id INTEGER,
+                message_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                poll_closed INTEGER DEFAULT 0,
+                PRIMARY KEY (guild_id, comic_id),
+                FOREIGN KEY (guild_id) REFERENCES guild(guild_id),
+                FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
+                );
+            INSERT INTO message_new (guild_id, comic_id, message_id, channel_id, sent_at, poll_closed)
+            SELECT guild_id, comic_id, message_id, channel_id, sent_at, poll_closed FROM message;
+            DROP TABLE message;
+            ALTER TABLE message_new RENAME TO message;
+
+            CREATE TABLE vote_new (
+                comic_id INTEGER,
+                user_id INTEGER,
+                rating INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (comic_id, user_id),
+                FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
+                );
+            INSERT INTO vote_new (comic_id, user_id, rating, message_id, timestamp)
+            SELECT comic_id, user_id, rating, message_id, timestamp FROM vote;
+            DROP TABLE vote;
+            ALTER TABLE vote_new RENAME TO vote;
+            COMMIT;
+            PRAGMA foreign_keys = ON;
+            """
+        )
+        logger.info("comic, message and vote rebuilt for comic sources")
+
+    async def _create_score_tables(self, cursor: aiosqlite.Cursor):
+        """
+        Rating aggregates kept up to date by triggers on vote, so leaderboards
+        never have to scan the vote table. Rows are never decremented on delete.
+        """
+        await cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comic_score'"
+        )
+        backfill = await cursor.fetchone() is None
+
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS comic_score (
+                comic_id INTEGER PRIMARY KEY,
+                votes INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
+                )
+        """
+        )
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guild_score (
+                guild_id INTEGER,
+                comic_id INTEGER,
+                votes INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, comic_id),
+                FOREIGN KEY (guild_id) REFERENCES guild(guild_id),
+                FOREIGN KEY (comic_id) REFERENCES comic(comic_id)
+                )
+        """
+        )
+        await cursor.execute(
+            "CREATE INDEX IF NOT EXISTS comic_score_avg ON comic_score (total * 1.0 / votes DESC)"
+        )
+        await cursor.execute(
+            "CREATE INDEX IF NOT EXISTS guild_score_avg ON guild_score (guild_id, total * 1.0 / votes DESC)"
+        )
+        await cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS vote_score_insert AFTER INSERT ON vote
+            BEGIN
+                INSERT INTO comic_score (comic_id, votes, total)
+                VALUES (NEW.comic_id, 1, NEW.rating)
+                ON CONFLICT(comic_id) DO UPDATE SET
+                votes = votes + 1,
+                total = total + excluded.total;
+
+                INSERT INTO guild_score (guild_id, comic_id, votes, total)
+                SELECT guild_id, NEW.comic_id, 1, NEW.rating
+                FROM message WHERE message_id = NEW.message_id AND comic_id = NEW.comic_id
+                ON CONFLICT(guild_id, comic_id) DO UPDATE SET
+                votes = votes + 1,
+                total = total + excluded.total;
+            END
+        """
+        )
+        await cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS vote_score_update AFTER UPDATE OF rating ON vote
+            WHEN NEW.rating != OLD.rating
+            BEGIN
+                UPDATE comic_score SET total = total + NEW.rating - OLD.rating
+                WHERE comic_id = NEW.comic_id;
+
+                UPDATE guild_score SET total = total + NEW.rating - OLD.rating
+                WHERE comic_id = NEW.comic_id AND guild_id = (
+                    SELECT guild_id FROM message
+                    WHERE message_id = NEW.message_id AND comic_id = NEW.comic_id
+                );
+            END
+        """
+        )
+        if backfill:
+            await cursor.execute(
+                """
+                INSERT INTO comic_score (comic_id, votes, total)
+                SELECT comic_id, COUNT(*), SUM(rating) FROM vote GROUP BY comic_id
+            """
+            )
+            await cursor.execute(
+                """
+                INSERT INTO guild_score (guild_id, comic_id, votes, total)
+                SELECT message.guild_id, vote.comic_id, COUNT(*), SUM(vote.rating)
+                FROM vote
+                JOIN message ON vote.message_id = message.message_id AND vote.comic_id = message.comic_id
+                GROUP BY message.guild_id, vote.comic_id
+            """
+            )
+            logger.info("rating aggregates created from existing votes")
+
     async def new_guild(self, guild_id: int, channel_id: int | None):
         async with self.connection.cursor() as cursor:
             await cursor.execute(
@@ -142,6 +588,7 @@ class DbManager:
                 )
                 return None
             await self.connection.commit()
+            self._forget_guild(guild_id)
             return True
 
     async def set_active_channel(self, guild_id: int, channel_id: int):
@@ -156,6 +603,7 @@ class DbManager:
                 )
                 return None
             await self.connection.commit()
+            self._forget_guild(guild_id)
             return True
 
     async def set_rating_mode(self, guild_id: int, rating_mode: int):
@@ -170,26 +618,130 @@ class DbManager:
                 )
                 return None
             await self.connection.commit()
+            self._forget_guild(guild_id)
             return True
 
-    async def get_guilds(self) -> list[GuildData] | None:
+    async def set_post_time(
+        self, guild_id: int, post_time: str | None, timezone: str | None
+    ):
         async with self.connection.cursor() as cursor:
-            await cursor.execute("SELECT * FROM guild")
-            rows = await cursor.fetchall()
-            return (
-                [
-                    GuildData(
-                        guild_id=row[0],
-                        channel_id=row[1],
-                        rating_mode=RatingMode(row[2]),
-                    )
-                    for row in rows
-                ]
-                if rows
-                else []
+            await cursor.execute(
+                "UPDATE guild SET post_time = ?, timezone = ? WHERE guild_id = ?",
+                (post_time, timezone, guild_id),
             )
+            if cursor.rowcount == 0:
+                logger.error(
+                    f"setting post time failed!!\nguild_id: {guild_id}\tpost_time: {post_time} {timezone}"
+                )
+                return None
+            await self.connection.commit()
+            self._forget_guild(guild_id)
+            return True
+
+    async def set_subscription(self, guild_id: int, source: str, subscribed: bool):
+        """
+        Subscribes a guild to a comic source or unsubscribes it
 
-    async def save_comic(self, date: str, url: str, bytes: bytes | None):
+        A guild without subscription rows gets the default source, so its
+        first change writes that row before applying the change, and the
+        last source can't be unsubscribed.
+
+        Returns:
+            True on success, False if it was the guild's last source, None
+            if the guild doesn't exist
+        """
+        try:
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT 1 FROM subscription WHERE guild_id = ?", (guild_id,)
+                )
+                if await cursor.fetchone() is None:
+                    await cursor.execute(
+                        "INSERT INTO subscription (guild_id, source) VALUES (?, ?)",
+                        (guild_id, DEFAULT_SOURCE),
+                    )
+                if subscribed:
+                    await cursor.execute(
+                        "INSERT OR IGNORE INTO subscription (guild_id, source) VALUES (?, ?)",
+                        (guild_id, source),
+                    )
+                else:
+                    await cursor.execute(
+                        "DELETE FROM subscription WHERE guild_id = ? AND source = ?",
+                        (guild_id, source),
+                    )
+                    await cursor.execute(
+                        "SELECT 1 FROM subscription WHERE guild_id = ?", (guild_id,)
+                    )
+                    if await cursor.fetchone() is None:
+                        await self.connection.rollback()
+                        return False
+                await self.connection.commit()
+                self._forget_guild(guild_id)
+                return True
+        except aiosqlite.Error as e:
+            logger.error(f"db error setting subscription of guild {guild_id}: {e}")
+            await self.connection.rollback()
+            return None
+
+    async def get_subscribed_sources(self) -> set[str]:
+        """Sources at least one guild gets, guilds without subscriptions get the default"""
+        subscribed = self._subscribed
+        if subscribed is None:
+            generation = self._guilds_generation
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT DISTINCT source FROM subscription
+                    UNION
+                    SELECT ? WHERE EXISTS (
+                        SELECT 1 FROM guild WHERE NOT EXISTS (
+                            SELECT 1 FROM subscription
+                            WHERE subscription.guild_id = guild.guild_id
+                        )
+                    )
+                    """,
+                    (DEFAULT_SOURCE,),
+                )
+                subscribed = {row[0] for row in await cursor.fetchall()}
+            if generation == self._guilds_generation:
+                self._subscribed = subscribed
+        return set(subscribed)
+
+    async def get_guilds(self) -> list[GuildData]:
+        guilds = self._all_guilds
+        if guilds is None:
+            generation = self._guilds_generation
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(GUILD_QUERY)
+                rows = await cursor.fetchall()
+                guilds = [guild_from_row(row) for row in rows]
+            if generation == self._guilds_generation:
+                self._all_guilds = guilds
+        return [replace(guild) for guild in guilds]
+
+    async def get_guild(self, guild_id: int) -> GuildData | None:
+        cached = self.guild_cache.get(guild_id)
+        if cached is not None:
+            return replace(cached)
+        generation = self.guild_cache.generation(guild_id)
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(f"{GUILD_QUERY} WHERE guild_id = ?", (guild_id,))
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            guild = guild_from_row(row)
+            self.guild_cache.put(guild_id, guild, generation)
+            return replace(guild)
+
+    async def save_comic(
+        self,
+        date: str,
+        url: str,
+        bytes: bytes | None,
+        img_hash: str | None = None,
+        source: str = DEFAULT_SOURCE,
+    ):
         fname = url.split("/")[3]
         path = (
             f"{IMAGE_PATH}{date}_{fname}.jpg"  # images/yyyy-mm-dd-1234567890abcdef.jpg
@@ -197,14 +749,13 @@ class DbManager:
         if not bytes:
             raise Exception("no image provided")
         img_content = bytes
-        with Image.open(io.BytesIO(img_content)) as img:
-            image_hash = str(imagehash.phash(img))
+        img_hash = img_hash or image_hash(img_content)
 
         try:
             async with self.connection.cursor() as cursor:
                 await cursor.execute(
-                    "INSERT OR IGNORE INTO comic (date, hash, url, path) VALUES (?, ?, ?, ?) RETURNING comic_id",
-                    (date, image_hash, url, path),
+                    "INSERT OR IGNORE INTO comic (date, hash, url, path, source) VALUES (?, ?, ?, ?, ?) RETURNING comic_id",
+                    (date, img_hash, url, path, source),
                 )
                 row = await cursor.fetchone()
                 if row is None:
@@ -221,6 +772,7 @@ class DbManager:
                     logger.critical(f"malformed comic id {comic_id}")
 
                 await self.connection.commit()
+                self.latest_cache.clear()
         except aiosqlite.Error as e:
             logger.error(f"db error: {e}")
             await self.connection.rollback()
@@ -228,29 +780,220 @@ class DbManager:
         except Exception as e:
             logger.error(f"saving comic failed: {e}")
             return None
-        return Comic(comic_id, date, image_hash, url, path, img_content)
+        return Comic(comic_id, date, img_hash, url, path, img_content, source=source)
 
     async def new_message(
-        self, guild_id: int, comic_id: int, message_id: int, channel_id: int
+        self,
+        guild_id: int,
+        comic_ids: list[int],
+        message_id: int,
+        channel_id: int,
+        rating_mode: RatingMode,
     ):
+        """
+        Stores a message carrying one or more comics, either all rows or none
+
+        The rating mode is stored with it, so a later /set_rating doesn't
+        change how an open message is closed.
+        """
         try:
             async with self.connection.cursor() as cursor:
-                await cursor.execute(
-                    "INSERT OR IGNORE INTO message (guild_id, comic_id, message_id, channel_id) VALUES (?,?,?,?)",
-                    (guild_id, comic_id, message_id, channel_id),
+                await cursor.executemany(
+                    "INSERT OR IGNORE INTO message (guild_id, comic_id, message_id, channel_id, rating_mode) VALUES (?,?,?,?,?)",
+                    [
+                        (guild_id, comic_id, message_id, channel_id, int(rating_mode))
+                        for comic_id in comic_ids
+                    ],
                 )
-                if cursor.rowcount == 0:
+                if cursor.rowcount != len(comic_ids):
                     logger.error(
-                        f"inserting message failed!\nguild_id: {guild_id}\tcomic_id: {comic_id}\tmessage_id: {message_id}"
+                        f"inserting message failed!\nguild_id: {guild_id}\tcomic_ids: {comic_ids}\tmessage_id: {message_id}"
                     )
+                    await self.connection.rollback()
                     return None
                 await self.connection.commit()
                 return True
         except aiosqlite.Error as e:
             logger.error(f"db error {e}")
+            await self.connection.rollback()
         except Exception as e:
             logger.error(f"error saving message: {e}")
 
+    async def get_message_id(self, guild_id: int, comic_id: int) -> int | None:
+        """Id of the message that carries a comic in a guild"""
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                "SELECT message_id FROM message WHERE guild_id = ? AND comic_id = ?",
+                (guild_id, comic_id),
+            )
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+    async def has_message(self, guild_id: int, comic_id: int) -> bool:
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                "SELECT 1 FROM message WHERE guild_id = ? AND comic_id = ?",
+                (guild_id, comic_id),
+            )
+            return await cursor.fetchone() is not None
+
+    async def start_deliveries(self, comic_id: int, guild_ids: list[int]):
+        """Journals a fan-out as pending for every guild in one transaction"""
+        async with self.connection.cursor() as cursor:
+            await cursor.executemany(
+                "INSERT OR IGNORE INTO delivery (comic_id, guild_id) VALUES (?, ?)",
+                [(comic_id, guild_id) for guild_id in guild_ids],
+            )
+            await self.connection.commit()
+
+    async def finish_deliveries(self, results: list[tuple[int, int, DeliveryState]]):
+        """Stores a batch of (comic_id, guild_id, state) delivery outcomes"""
+        async with self.connection.cursor() as cursor:
+            await cursor.executemany(
+                "UPDATE delivery SET state = ?, updated_at = CURRENT_TIMESTAMP WHERE comic_id = ? AND guild_id = ?",
+                [
+                    (int(state), comic_id, guild_id)
+                    for comic_id, guild_id, state in results
+                ],
+            )
+            await self.connection.commit()
+
+    async def get_subscriber_ids(self, source: str) -> list[int]:
+        """Ids of guilds with a channel that get comics of a source"""
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT guild_id FROM guild
+                WHERE channel_id IS NOT NULL AND (
+                    EXISTS (
+                        SELECT 1 FROM subscription
+                        WHERE subscription.guild_id = guild.guild_id AND subscription.source = ?
+                    ) OR (? = ? AND NOT EXISTS (
+                        SELECT 1 FROM subscription WHERE subscription.guild_id = guild.guild_id
+                    ))
+                )
+                """,
+                (source, source, DEFAULT_SOURCE),
+            )
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def get_pending_deliveries(
+        self,
+    ) -> dict[int, list[tuple[GuildData, datetime]]]:
+        """
+        Gets guilds still waiting for an open comic, grouped by comic id,
+        with the UTC time the delivery was journaled
+
+        Deliveries whose message got stored before a crash are marked sent
+        first, so they are never posted twice.
+        """
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                UPDATE delivery SET state = 1, updated_at = CURRENT_TIMESTAMP
+                WHERE state = 0 AND EXISTS (
+                    SELECT 1 FROM message
+                    WHERE message.guild_id = delivery.guild_id AND message.comic_id = delivery.comic_id
+                )
+                """
+            )
+            await self.connection.commit()
+            await cursor.execute(
+                """
+                SELECT delivery.comic_id, guild.guild_id, guild.channel_id, guild.rating_mode, guild.post_time, guild.timezone, delivery.updated_at
+                FROM delivery
+                JOIN comic ON delivery.comic_id = comic.comic_id
+                JOIN guild ON delivery.guild_id = guild.guild_id
+                WHERE delivery.state = 0 AND comic.poll_closed = 0
+                """
+            )
+            rows = await cursor.fetchall()
+            pending: dict[int, list[tuple[GuildData, datetime]]] = {}
+            for row in rows:
+                pending.setdefault(row[0], []).append(
+                    (
+                        GuildData(
+                            guild_id=row[1],
+                            channel_id=row[2],
+                            rating_mode=RatingMode(row[3]),
+                            post_time=row[4],
+                            timezone=row[5],
+                        ),
+                        datetime.fromisoformat(row[6]).replace(tzinfo=timezone.utc),
+                    )
+                )
+            return pending
+
+    async def add_webhook(self, url: str) -> bool:
+        """Adds a webhook for the standalone scraper, re-enables a removed one"""
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                INSERT INTO webhook (url) VALUES (?)
+                ON CONFLICT(url) DO UPDATE SET active = 1 WHERE active = 0
+                """,
+                (url,),
+            )
+            await self.connection.commit()
+            return cursor.rowcount > 0
+
+    async def disable_webhooks(self, webhook_ids: list[int]):
+        """Stops delivering to webhooks, their delivery history is kept"""
+        async with self.connection.cursor() as cursor:
+            await cursor.executemany(
+                "UPDATE webhook SET active = 0 WHERE webhook_id = ?",
+                [(webhook_id,) for webhook_id in webhook_ids],
+            )
+            await self.connection.commit()
+
+    async def remove_webhook(self, url: str) -> bool:
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                "UPDATE webhook SET active = 0 WHERE url = ? AND active = 1", (url,)
+            )
+            await self.connection.commit()
+            return cursor.rowcount > 0
+
+    async def get_undelivered_webhooks(self, comic_id: int) -> list[tuple[int, str]]:
+        """Gets (webhook_id, url) of active webhooks that haven't got the comic yet"""
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT webhook_id, url FROM webhook
+                WHERE active = 1 AND NOT EXISTS (
+                    SELECT 1 FROM webhook_delivery AS d
+                    WHERE d.webhook_id = webhook.webhook_id AND d.comic_id = ? AND d.state = 1
+                )
+                """,
+                (comic_id,),
+            )
+            rows = await cursor.fetchall()
+            return [(row[0], row[1]) for row in rows]
+
+    async def finish_webhook_deliveries(
+        self,
+        comic_id: int,
+        results: list[tuple[int, DeliveryState, int, str | None]],
+    ):
+        """Stores a batch of (webhook_id, state, attempts, error) delivery outcomes"""
+        async with self.connection.cursor() as cursor:
+            await cursor.executemany(
+                """
+                INSERT INTO webhook_delivery (comic_id, webhook_id, state, attempts, error)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(comic_id, webhook_id) DO UPDATE SET
+                state = excluded.state,
+                attempts = attempts + excluded.attempts,
+                error = excluded.error,
+                updated_at = CURRENT_TIMESTAMP
+                """,
+                [
+                    (comic_id, webhook_id, int(state), attempts, error)
+                    for webhook_id, state, attempts, error in results
+                ],
+            )
+            await self.connection.commit()
+
     async def get_message_ids_by_comic_id(self, comic_id: int):
         async with self.connection.cursor() as cursor:
             await cursor.execute(
@@ -266,17 +1009,21 @@ class DbManager:
             rows = await cursor.fetchall()
             return {row[0] for row in rows}
 
-    async def get_active_messages(self):
-        async with self.connection.cursor() as cursor:
-            await cursor.execute(
-                """
-                SELECT message.message_id, message.channel_id, guild.guild_id, comic.comic_id, guild.rating_mode 
+    async def get_active_messages(self, guild_id: int | None = None):
+        query = """
+                SELECT message.message_id, message.channel_id, guild.guild_id, comic.comic_id,
+                    COALESCE(message.rating_mode, guild.rating_mode) AS rating_mode
                 FROM message
                 JOIN comic ON message.comic_id = comic.comic_id
                 JOIN guild ON message.guild_id = guild.guild_id
-                WHERE comic.poll_closed = 0
+                WHERE comic.poll_closed = 0 AND message.poll_closed = 0
                 """
-            )
+        params: tuple[int, ...] = ()
+        if guild_id is not None:
+            query += " AND message.guild_id = ?"
+            params = (guild_id,)
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(query, params)
             rows = await cursor.fetchall()
             return (
                 [
@@ -300,17 +1047,83 @@ class DbManager:
                 f"UPDATE comic SET poll_closed = 1 WHERE comic_id IN ({placeholder})",
                 list(comic_ids),
             )
+            await cursor.execute(
+                f"UPDATE message SET poll_closed = 1 WHERE comic_id IN ({placeholder})",
+                list(comic_ids),
+            )
             await self.connection.commit()
+            self._forget_comics(comic_ids)
 
-    async def get_past_n_comics(self, count: int):
+    async def close_messages(self, message_ids: list[int]) -> set[int]:
+        """
+        Closes the polls of single messages
+
+        Returns:
+            Comic ids that have no open messages left and got closed
+        """
+        if not message_ids:
+            return set()
+        placeholder = ", ".join(["?"] * len(message_ids))
         async with self.connection.cursor() as cursor:
             await cursor.execute(
-                "SELECT comic_id, date, hash, url, path, poll_closed FROM comic ORDER BY date DESC LIMIT ?",
-                (count,),
+                f"UPDATE message SET poll_closed = 1 WHERE message_id IN ({placeholder}) RETURNING comic_id",
+                message_ids,
             )
-            rows = await cursor.fetchall()
-            return (
-                [
+            comic_ids = list({row[0] for row in await cursor.fetchall()})
+            placeholder = ", ".join(["?"] * len(comic_ids))
+            await cursor.execute(
+                f"""
+                UPDATE comic SET poll_closed = 1
+                WHERE comic_id IN ({placeholder}) AND poll_closed = 0
+                AND NOT EXISTS (
+                    SELECT 1 FROM message
+                    WHERE message.comic_id = comic.comic_id AND message.poll_closed = 0
+                )
+                RETURNING comic_id
+                """,
+                comic_ids,
+            )
+            closed = {row[0] for row in await cursor.fetchall()}
+            await self.connection.commit()
+            self._forget_comics(closed)
+            return closed
+
+    async def get_comic(self, comic_id: int) -> Comic | None:
+        cached = self.comic_cache.get(comic_id)
+        if cached is not None:
+            return replace(cached)
+        generation = self.comic_cache.generation(comic_id)
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                "SELECT comic_id, date, hash, url, path, poll_closed, source FROM comic WHERE comic_id = ?",
+                (comic_id,),
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            comic = Comic(
+                id=row[0],
+                date=row[1],
+                img_hash=row[2],
+                url=row[3],
+                path=row[4],
+                poll_closed=row[5],
+                source=row[6],
+            )
+            self.comic_cache.put(comic_id, comic, generation)
+            return replace(comic)
+
+    async def get_past_n_comics(self, count: int, source: str = DEFAULT_SOURCE):
+        cached = self.latest_cache.get((source, count))
+        if cached is None:
+            generation = self.latest_cache.generation((source, count))
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT comic_id, date, hash, url, path, poll_closed FROM comic WHERE source = ? ORDER BY date DESC LIMIT ?",
+                    (source, count),
+                )
+                rows = await cursor.fetchall()
+                cached = [
                     Comic(
                         id=row[0],
                         date=row[1],
@@ -318,12 +1131,16 @@ class DbManager:
                         url=row[3],
                         path=row[4],
                         poll_closed=row[5],
+                        source=source,
                     )
                     for row in rows
                 ]
-                if rows
-                else []
-            )
+                self.latest_cache.put((source, count), cached, generation)
+        return [replace(comic) for comic in cached]
+
+    async def latest_hash(self, source: str = DEFAULT_SOURCE) -> str | None:
+        latest = await self.get_past_n_comics(1, source)
+        return latest[0].img_hash if latest else None
 
     async def save_vote(
         self, comic_id: int, user_id: int, rating: int, message_id: int
@@ -344,23 +1161,193 @@ class DbManager:
             )
             await self.connection.commit()
 
+    async def remove_vote(self, comic_id: int, user_id: int, rating: int):
+        """
+        Deletes a vote if it still has the given rating and takes it out of
+        the aggregates, which the vote triggers don't do for deletes.
+        """
+        try:
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(
+                    "DELETE FROM vote WHERE comic_id = ? AND user_id = ? AND rating = ? RETURNING message_id",
+                    (comic_id, user_id, rating),
+                )
+                row = await cursor.fetchone()
+                if row is None:
+                    return None
+                await cursor.execute(
+                    "UPDATE comic_score SET votes = votes - 1, total = total - ? WHERE comic_id = ?",
+                    (rating, comic_id),
+                )
+                await cursor.execute(
+                    """
+                    UPDATE guild_score SET votes = votes - 1, total = total - ?
+                    WHERE comic_id = ? AND guild_id = (
+                        SELECT guild_id FROM message WHERE message_id = ? AND comic_id = ?
+                    )
+                    """,
+                    (rating, comic_id, row[0], comic_id),
+                )
+                await self.connection.commit()
+                return True
+        except aiosqlite.Error as e:
+            logger.error(f"db error removing vote: {e}")
+            await self.connection.rollback()
+            return None
+
+    async def save_poll_results(
+        self, message_id: int, guild_id: int, comic_id: int, counts: dict[int, int]
+    ):
+        """
+        Stores the final answer counts of a native Discord poll
+
+        Discord doesn't tell who voted what without paging through every
+        answer's voters, so poll votes are kept as counts per rating instead
+        of vote rows and added to the aggregates here in one transaction.
+        A message that already has results is skipped.
+
+        Args:
+            message_id (int): Discord message ID of the poll
+            guild_id (int): Discord guild ID
+            comic_id (int): Internal comic ID
+            counts (dict[int, int]): {rating: number of votes}
+        """
+        counts = {rating: n for rating, n in counts.items() if n > 0}
+        try:
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT 1 FROM poll_result WHERE message_id = ?", (message_id,)
+                )
+                if await cursor.fetchone() is not None or not counts:
+                    return None
+                await cursor.executemany(
+                    """
+                    INSERT INTO poll_result (message_id, guild_id, comic_id, rating, votes)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (message_id, guild_id, comic_id, rating, n)
+                        for rating, n in counts.items()
+                    ],
+                )
+                votes = sum(counts.values())
+                total = sum(rating * n for rating, n in counts.items())
+                await cursor.execute(
+                    """
+                    INSERT INTO comic_score (comic_id, votes, total) VALUES (?, ?, ?)
+                    ON CONFLICT(comic_id) DO UPDATE SET
+                    votes = votes + excluded.votes,
+                    total = total + excluded.total
+                    """,
+                    (comic_id, votes, total),
+                )
+                await cursor.execute(
+                    """
+                    INSERT INTO guild_score (guild_id, comic_id, votes, total) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(guild_id, comic_id) DO UPDATE SET
+                    votes = votes + excluded.votes,
+                    total = total + excluded.total
+                    """,
+                    (guild_id, comic_id, votes, total),
+                )
+                await self.connection.commit()
+                return True
+        except aiosqlite.Error as e:
+            logger.error(f"db error saving poll results of message {message_id}: {e}")
+            await self.connection.rollback()
+            return None
+
     async def get_votes(self, guild_id: int, comic_id: int):
         async with self.connection.cursor() as cursor:
             await cursor.execute(
-                """SELECT 
-                    rating,
-                    COUNT(*) FILTER (WHERE message_id IN (SELECT message_id FROM message WHERE guild_id = ?)) as local_count,
-                    COUNT(*) as global_count
-                FROM vote
-                WHERE comic_id = ?
+                """SELECT rating, SUM(local_count), SUM(global_count) FROM (
+                    SELECT 
+                        rating,
+                        COUNT(*) FILTER (WHERE message_id IN (SELECT message_id FROM message WHERE guild_id = ?)) as local_count,
+                        COUNT(*) as global_count
+                    FROM vote
+                    WHERE comic_id = ?
+                    GROUP BY rating
+                    UNION ALL
+                    SELECT
+                        rating,
+                        COALESCE(SUM(votes) FILTER (WHERE guild_id = ?), 0),
+                        SUM(votes)
+                    FROM poll_result
+                    WHERE comic_id = ?
+                    GROUP BY rating
+                )
                 GROUP BY rating""",
-                (guild_id, comic_id),
+                (guild_id, comic_id, guild_id, comic_id),
             )
             rows = await cursor.fetchall()
             return {
                 row[0]: (row[1], row[2]) for row in rows
             }  # {rating: (local, global)}
 
+    async def get_top_comics(
+        self, count: int, guild_id: int | None = None, min_votes: int = 1
+    ) -> list[ComicScore]:
+        """
+        Gets the best rated comics from the rating aggregates
+
+        Args:
+            count (int): How many comics to return
+            guild_id (int | None): Rank by this guild's votes, all guilds if None
+            min_votes (int): Skip comics with fewer votes than this
+
+        Returns:
+            A list of ComicScores sorted by average rating descending
+        """
+        if guild_id is None:
+            query = """
+                SELECT comic.comic_id, comic.date, score.votes, score.total * 1.0 / score.votes AS average, comic.source
+                FROM comic_score AS score
+                JOIN comic ON score.comic_id = comic.comic_id
+                WHERE score.votes >= ?
+                ORDER BY score.total * 1.0 / score.votes DESC
+                LIMIT ?"""
+            params = (min_votes, count)
+        else:
+            query = """
+                SELECT comic.comic_id, comic.date, score.votes, score.total * 1.0 / score.votes AS average, comic.source
+                FROM guild_score AS score
+                JOIN comic ON score.comic_id = comic.comic_id
+                WHERE score.guild_id = ? AND score.votes >= ?
+                ORDER BY score.total * 1.0 / score.votes DESC
+                LIMIT ?"""
+            params = (guild_id, min_votes, count)
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            rows = await cursor.fetchall()
+            return [ComicScore(row[0], row[1], row[2], row[3], row[4]) for row in rows]
+
+    async def get_guild_history(self, guild_id: int, count: int) -> list[ComicScore]:
+        """
+        Gets a guild's average rating for its latest rated comics
+
+        Args:
+            guild_id (int): Discord ID of the guild
+            count (int): How many comics to return
+
+        Returns:
+            A list of ComicScores sorted by comic date descending
+        """
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT comic.comic_id, comic.date, score.votes, score.total * 1.0 / score.votes AS average, comic.source
+                FROM guild_score AS score
+                JOIN comic ON score.comic_id = comic.comic_id
+                WHERE score.guild_id = ? AND score.votes > 0
+                ORDER BY score.comic_id DESC
+                LIMIT ?
+                """,
+                (guild_id, count),
+            )
+            rows = await cursor.fetchall()
+            return [ComicScore(row[0], row[1], row[2], row[3], row[4]) for row in rows]
+
     async def get_guild_user_votes(self, guild_id:int, comic_id:int) -> list[dict[str, int]]:
         """
         Gets local user ratings for a specific comic in a guild
@@ -380,7 +1367,7 @@ class DbManager:
                 await cursor.execute("""
                     SELECT vote.user_id, vote.rating
                     FROM vote
-                    JOIN message ON vote.message_id = message.message_id
+                    JOIN message ON vote.message_id = message.message_id AND vote.comic_id = message.comic_id
                     WHERE vote.comic_id = ? AND message.guild_id = ?
                     ORDER BY vote.rating DESC
                 """,
@@ -392,5 +1379,70 @@ class DbManager:
             logger.critical(f"DB error when getting ratings for guild id {guild_id}: {e}")
             raise
 
+    async def get_prunable_comic_ids(self, retention_days: int) -> list[int]:
+        """
+        Gets closed comics older than the retention period that still have raw votes
+
+        Their ratings are already rolled up in comic_score and guild_score.
+        """
+        async with self.connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT comic_id FROM comic
+                WHERE poll_closed = 1 AND date < date('now', ?)
+                AND EXISTS (SELECT 1 FROM vote WHERE vote.comic_id = comic.comic_id)
+                ORDER BY comic_id
+                """,
+                (f"-{retention_days} days",),
+            )
+            rows = await cursor.fetchall()
+            return [row[0] for row in rows]
+
+    async def prune_votes(self, comic_ids: list[int]) -> int:
+        """
+        Deletes raw votes of the given comics one comic per transaction
+
+        Aggregates are left as they are, there is no delete trigger on vote.
+
+        Returns:
+            Number of deleted vote rows
+        """
+        deleted = 0
+        for comic_id in comic_ids:
+            try:
+                async with self.connection.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM vote WHERE comic_id = ?", (comic_id,)
+                    )
+                    deleted += cursor.rowcount
+                    await self.connection.commit()
+            except aiosqlite.Error as e:
+                logger.error(f"db error pruning votes of comic {comic_id}: {e}")
+                await self.connection.rollback()
+        return deleted
+
+    async def incremental_vacuum(self, pages: int) -> tuple[int, int]:
+        """
+        Returns up to `pages` free pages to the filesystem and truncates the WAL
+
+        Returns:
+            Free pages before and after the vacuum
+        """
+        async with self.connection.cursor() as cursor:
+            await cursor.execute("PRAGMA freelist_count")
+            row = await cursor.fetchone()
+            before = row[0] if row else 0
+            # execute() only steps the pragma once, freeing a single page
+            await self.connection.executescript(
+                f"PRAGMA incremental_vacuum({int(pages)})"
+            )
+            await cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            await cursor.fetchall()
+            await cursor.execute("PRAGMA optimize")
+            await cursor.execute("PRAGMA freelist_count")
+            row = await cursor.fetchone()
+            after = row[0] if row else 0
+            return before, after
+
     async def close(self):
         await self.connection.close()
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import sys
+from collections.abc import Sequence
+from datetime import datetime
+from typing import IO, Any
+
+import aiosqlite
+
+from fingerpori_db import DB
+
+logger = logging.getLogger("fingerpori_export")
+
+TABLES = (
+    "comic",
+    "guild",
+    "subscription",
+    "message",
+    "vote",
+    "poll_result",
+    "comic_score",
+    "guild_score",
+)
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 5000
+EXPORT_PATH = "exports/"
+
+
+def _write_chunk(
+    fh: IO[str], fmt: str, columns: list[str], rows: Sequence[Any]
+):
+    if fmt == "csv":
+        csv.writer(fh).writerows(rows)
+    else:
+        fh.writelines(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+async def export_query(
+    conn: aiosqlite.Connection,
+    query: str,
+    params: tuple[Any, ...] | list[Any],
+    path: str,
+    fmt: str = "jsonl",
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Streams the rows of a query into a gzipped file, returns the row count."""
+    count = 0
+    async with conn.execute(query, params) as cursor:
+        columns = [col[0] for col in cursor.description]
+        fh = await asyncio.to_thread(
+            gzip.open, path, "wt", encoding="utf-8", newline=""
+        )
+        try:
+            if fmt == "csv":
+                await asyncio.to_thread(
+                    _write_chunk, fh, fmt, columns, [tuple(columns)]
+                )
+            while rows := list(await cursor.fetchmany(chunk_size)):
+                await asyncio.to_thread(_write_chunk, fh, fmt, columns, rows)
+                count += len(rows)
+        finally:
+            await asyncio.to_thread(fh.close)
+    return count
+
+
+async def export_tables(
+    db_path: str = DB,
+    out_dir: str = EXPORT_PATH,
+    fmt: str = "csv",
+    chunk_size: int = CHUNK_SIZE,
+    tables: tuple[str, ...] = TABLES,
+) -> list[str]:
+    """
+    Streams tables into gzipped csv or json lines files
+
+    All tables are read inside one read transaction on a separate read-only
+    connection, so the files match a single snapshot of the db. With the db
+    in WAL mode the export never blocks vote writes.
+
+    Args:
+        db_path (str): Path to the sqlite db
+        out_dir (str): Directory to write the files in
+        fmt (str): "csv" or "jsonl"
+        chunk_size (int): Rows held in memory at a time
+        tables (tuple[str, ...]): Tables to export
+
+    Returns:
+        Paths of the written files
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt}")
+    for table in tables:
+        if table not in TABLES:
+            raise ValueError(f"unknown table {table}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    paths: list[str] = []
+
+    async with aiosqlite.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        await conn.execute("BEGIN")
+        try:
+            for table in tables:
+                path = os.path.join(out_dir, f"{table}-{stamp}.{fmt}.gz")
+                count = await export_query(
+                    conn, f"SELECT * FROM {table}", (), path, fmt, chunk_size
+                )
+                logger.info(f"exported {count} rows from {table} to {path}")
+                paths.append(path)
+        finally:
+            await conn.rollback()
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fingerpori db")
+    parser.add_argument("--db", default=DB)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", default=EXPORT_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=list(TABLES))
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=sys.stderr,
+        format="[{asctime}] [{levelname:<8}] {name}: {message}",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        style="{",
+    )
+    for path in asyncio.run(
+        export_tables(
+            args.db, args.out, args.format, args.chunk_size, tuple(args.tables)
+        )
+    ):
+        print(path)
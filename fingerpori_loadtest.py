@@ -0,0 +1,640 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from aiohttp import BodyPartReader, web
+from PIL import Image
+
+from fingerpori_bench import percentile
+
+logger = logging.getLogger("fingerpori_loadtest")
+
+API_VERSION = 10
+APPLICATION_ID = 900000000000000001
+BOT_USER = {
+    "id": str(APPLICATION_ID),
+    "username": "fingerpori",
+    "discriminator": "0",
+    "global_name": None,
+    "avatar": None,
+    "bot": True,
+}
+
+
+def json_response(
+    data: Any, status: int = 200, headers: dict[str, str] | None = None
+) -> web.Response:
+    # discord.py only decodes bodies whose content type is exactly application/json
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers={**(headers or {}), "Content-Type": "application/json"},
+    )
+
+
+class FakeDiscord:
+    """Local stand-in for the parts of the Discord REST API the bot uses."""
+
+    def __init__(
+        self,
+        latency_ms: float,
+        jitter: float,
+        bucket_limit: int,
+        bucket_window: float,
+        ratelimit_chance: float,
+        seed: int,
+    ):
+        self.latency: float = latency_ms / 1000
+        self.jitter: float = jitter
+        self.bucket_limit: int = bucket_limit
+        self.bucket_window: float = bucket_window
+        self.ratelimit_chance: float = ratelimit_chance
+        self.rng: random.Random = random.Random(seed)
+
+        self.channels: dict[int, int] = {}  # {channel_id: guild_id}
+        self.messages: dict[int, dict[str, Any]] = {}
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self._buckets: dict[str, tuple[float, int]] = {}
+        self._ids = itertools.count(1 << 60)
+        self._runner: web.AppRunner | None = None
+
+    def add_channel(self, channel_id: int, guild_id: int):
+        self.channels[channel_id] = guild_id
+
+    def snapshot(self) -> tuple[Counter[str], Counter[str]]:
+        return self.calls.copy(), self.rate_limited.copy()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(middlewares=[self._middleware])
+        base = f"/api/v{API_VERSION}"
+        app.router.add_get(f"{base}/users/@me", self.get_me, name="get_me")
+        app.router.add_get(
+            f"{base}/oauth2/applications/@me", self.get_app, name="get_application"
+        )
+        app.router.add_get(
+            f"{base}/channels/{{channel_id}}", self.get_channel, name="get_channel"
+        )
+        app.router.add_post(
+            f"{base}/channels/{{channel_id}}/messages",
+            self.send_message,
+            name="send_message",
+        )
+        app.router.add_get(
+            f"{base}/channels/{{channel_id}}/messages/{{message_id}}",
+            self.get_message,
+            name="get_message",
+        )
+        app.router.add_patch(
+            f"{base}/channels/{{channel_id}}/messages/{{message_id}}",
+            self.edit_message,
+            name="edit_message",
+        )
+        app.router.add_delete(
+            f"{base}/channels/{{channel_id}}/messages/{{message_id}}",
+            self.delete_message,
+            name="delete_message",
+        )
+        app.router.add_put(
+            f"{base}/channels/{{channel_id}}/messages/{{message_id}}/reactions/{{emoji}}/@me",
+            self.add_reaction,
+            name="add_reaction",
+        )
+        app.router.add_post(
+            f"{base}/channels/{{channel_id}}/polls/{{message_id}}/expire",
+            self.expire_poll,
+            name="expire_poll",
+        )
+        app.router.add_post(
+            f"{base}/interactions/{{interaction_id}}/{{token}}/callback",
+            self.interaction_callback,
+            name="interaction_callback",
+        )
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        self._runner = runner
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        sock_port = runner.addresses[0][1]
+        return f"http://{host}:{sock_port}{base}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler: Any):
+        name = request.match_info.route.name or "unknown"
+        self.calls[name] += 1
+
+        delay = self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # interaction callbacks are not limited per bucket by discord
+        headers: dict[str, str] = {}
+        if name != "interaction_callback" and self.bucket_limit > 0:
+            major = request.match_info.get("channel_id", "")
+            key = f"{request.method}:{name}:{major}"
+            now = time.monotonic()
+            start, used = self._buckets.get(key, (now, 0))
+            if now - start >= self.bucket_window:
+                start, used = now, 0
+            reset_after = self.bucket_window - (now - start)
+            if used >= self.bucket_limit:
+                return self._too_many(name, reset_after)
+            used += 1
+            self._buckets[key] = (start, used)
+            headers = {
+                "X-RateLimit-Limit": str(self.bucket_limit),
+                "X-RateLimit-Remaining": str(self.bucket_limit - used),
+                "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+                "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+                "X-RateLimit-Bucket": f"{request.method}:{name}",
+            }
+
+        if self.ratelimit_chance and self.rng.random() < self.ratelimit_chance:
+            return self._too_many(name, self.rng.uniform(0.05, 0.5))
+
+        response: web.StreamResponse = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def _too_many(self, name: str, retry_after: float) -> web.Response:
+        self.rate_limited[name] += 1
+        return json_response(
+            {
+                "message": "You are being rate limited.",
+                "retry_after": retry_after,
+                "global": False,
+            },
+            status=429,
+            headers={
+                # without Via discord.py treats the 429 as a cloudflare ban
+                "Via": "1.1 google",
+                "Retry-After": f"{retry_after:.3f}",
+                "X-RateLimit-Scope": "user",
+            },
+        )
+
+    async def _payload(self, request: web.Request) -> dict[str, Any]:
+        if request.content_type == "multipart/form-data":
+            reader = await request.multipart()
+            async for part in reader:
+                if isinstance(part, BodyPartReader) and part.name == "payload_json":
+                    return json.loads(await part.text())
+            return {}
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    def _channel_payload(self, channel_id: int) -> dict[str, Any]:
+        return {
+            "id": str(channel_id),
+            "type": 0,
+            "guild_id": str(self.channels[channel_id]),
+            "name": f"fingerpori-{channel_id}",
+            "position": 0,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+        }
+
+    def _poll_payload(self, body: dict[str, Any]) -> dict[str, Any]:
+        duration = timedelta(hours=body.get("duration", 24))
+        expiry = datetime.now(timezone.utc) + duration
+        answers = [
+            {"answer_id": i, "poll_media": answer["poll_media"]}
+            for i, answer in enumerate(body.get("answers") or [], start=1)
+        ]
+        return {
+            "question": body["question"],
+            "answers": answers,
+            "expiry": expiry.isoformat(),
+            "allow_multiselect": body.get("allow_multiselect", False),
+            "layout_type": body.get("layout_type", 1),
+            "results": {"is_finalized": False, "answer_counts": []},
+        }
+
+    def _message_payload(
+        self, message_id: int, channel_id: int, body: dict[str, Any]
+    ) -> dict[str, Any]:
+        extra = {"poll": self._poll_payload(body["poll"])} if body.get("poll") else {}
+        return {
+            **extra,
+            "id": str(message_id),
+            "channel_id": str(channel_id),
+            "guild_id": str(self.channels[channel_id]),
+            "type": 0,
+            "author": BOT_USER,
+            "content": body.get("content") or "",
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "flags": 0,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "edited_timestamp": None,
+        }
+
+    def _not_found(self) -> web.Response:
+        return json_response({"message": "Unknown", "code": 10003}, status=404)
+
+    async def get_me(self, request: web.Request):
+        return json_response(BOT_USER)
+
+    async def get_app(self, request: web.Request):
+        return json_response(
+            {
+                "id": str(APPLICATION_ID),
+                "name": "fingerpori",
+                "description": "",
+                "icon": None,
+                "bot_public": False,
+                "bot_require_code_grant": False,
+                "owner": BOT_USER,
+                "verify_key": "0" * 64,
+                "flags": 0,
+            }
+        )
+
+    async def get_channel(self, request: web.Request):
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self.channels:
+            return self._not_found()
+        return json_response(self._channel_payload(channel_id))
+
+    async def send_message(self, request: web.Request):
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self.channels:
+            return self._not_found()
+        body = await self._payload(request)
+        message_id = next(self._ids)
+        message = self._message_payload(message_id, channel_id, body)
+        self.messages[message_id] = message
+        return json_response(message)
+
+    async def get_message(self, request: web.Request):
+        message = self.messages.get(int(request.match_info["message_id"]))
+        if not message:
+            return self._not_found()
+        return json_response(message)
+
+    async def edit_message(self, request: web.Request):
+        message = self.messages.get(int(request.match_info["message_id"]))
+        if not message:
+            return self._not_found()
+        body = await self._payload(request)
+        for key in ("content", "embeds", "components"):
+            if key in body:
+                message[key] = body[key]
+        message["edited_timestamp"] = datetime.now(timezone.utc).isoformat()
+        return json_response(message)
+
+    async def delete_message(self, request: web.Request):
+        self.messages.pop(int(request.match_info["message_id"]), None)
+        return web.Response(status=204)
+
+    async def add_reaction(self, request: web.Request):
+        if int(request.match_info["message_id"]) not in self.messages:
+            return self._not_found()
+        return web.Response(status=204)
+
+    async def expire_poll(self, request: web.Request):
+        message = self.messages.get(int(request.match_info["message_id"]))
+        if not message or "poll" not in message:
+            return self._not_found()
+        poll = message["poll"]
+        # votes nobody clicked through the api, drawn when the poll ends
+        poll["results"] = {
+            "is_finalized": True,
+            "answer_counts": [
+                {
+                    "id": answer["answer_id"],
+                    "count": self.rng.randint(0, 50),
+                    "me_voted": False,
+                }
+                for answer in poll["answers"]
+            ],
+        }
+        poll["expiry"] = datetime.now(timezone.utc).isoformat()
+        return json_response(message)
+
+    async def interaction_callback(self, request: web.Request):
+        body = await self._payload(request)
+        return json_response(
+            {
+                "interaction": {
+                    "id": request.match_info["interaction_id"],
+                    "type": 3,
+                },
+                "resource": {"type": body.get("type", 7)},
+            }
+        )
+
+
+def fake_comic(source: str = "fingerpori") -> dict[str, str | bytes]:
+    with io.BytesIO() as buf:
+        Image.new("RGB", (64, 32), color=(200, 200, 200)).save(buf, format="JPEG")
+        img_bytes = buf.getvalue()
+    return {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "url": f"https://loadtest.invalid/{source}/1920.jpg",
+        "bytes": img_bytes,
+    }
+
+
+def interaction_payload(
+    interaction_id: int, message: dict[str, Any], user_id: int, custom_id: str
+) -> dict[str, Any]:
+    channel_id = int(message["channel_id"])
+    return {
+        "id": str(interaction_id),
+        "application_id": str(APPLICATION_ID),
+        "type": 3,
+        "token": f"token-{interaction_id}",
+        "version": 1,
+        "guild_id": message["guild_id"],
+        "channel_id": str(channel_id),
+        "channel": {
+            "id": str(channel_id),
+            "type": 0,
+            "guild_id": message["guild_id"],
+            "name": f"fingerpori-{channel_id}",
+            "position": 0,
+            "permission_overwrites": [],
+        },
+        "data": {"custom_id": custom_id, "component_type": 2},
+        "message": message,
+        "member": {
+            "user": {
+                "id": str(user_id),
+                "username": f"user{user_id}",
+                "discriminator": "0",
+                "global_name": None,
+                "avatar": None,
+            },
+            "roles": [],
+            "joined_at": datetime.now(timezone.utc).isoformat(),
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+        },
+        "app_permissions": "0",
+        "attachment_size_limit": 10 * 1024 * 1024,
+        "locale": "fi",
+    }
+
+
+def phase_report(
+    name: str,
+    fake: FakeDiscord,
+    before: tuple[Counter[str], Counter[str]],
+    duration: float,
+    operations: int,
+    latencies: list[float] | None = None,
+) -> dict[str, Any]:
+    calls = fake.calls - before[0]
+    limited = fake.rate_limited - before[1]
+    report: dict[str, Any] = {
+        "name": name,
+        "operations": operations,
+        "duration_s": duration,
+        "throughput_per_s": operations / duration if duration > 0 else 0.0,
+        "api_calls": dict(calls),
+        "api_calls_total": sum(calls.values()),
+        "rate_limited": dict(limited),
+    }
+    if latencies:
+        report["latency_ms"] = {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        }
+    logger.info(
+        f"{name}: {operations} ops in {duration:.2f}s\tapi calls {report['api_calls_total']}\t429s {sum(limited.values())}"
+    )
+    return report
+
+
+async def main(args: argparse.Namespace):
+    workdir = tempfile.mkdtemp(prefix="fpori-loadtest-")
+    os.chdir(workdir)
+    os.environ["DB"] = os.path.join(workdir, "loadtest.db")
+    os.environ.setdefault("TOKEN", "loadtest")
+    os.environ.setdefault("USER_ID", "1")
+
+    # the bot reads its config from the environment on import
+    import discord
+    from discord.http import Route
+
+    import fingerpori_bot
+    import fingerpori_scraper
+    from fingerpori_db import DEFAULT_SOURCE, DbManager, RatingMode
+    from fingerpori_sources import ComicSource, HsStrip, register
+
+    fake = FakeDiscord(
+        args.latency_ms,
+        args.jitter,
+        args.bucket_limit,
+        args.bucket_window,
+        args.ratelimit_chance,
+        args.seed,
+    )
+    Route.BASE = await fake.start()
+    logger.info(f"fake discord api at {Route.BASE}, working dir {workdir}")
+
+    sources = [DEFAULT_SOURCE]
+    for i in range(1, args.sources):
+        key = f"loadtest-{i}"
+        register(
+            HsStrip(key, f"Testi {i}", f"https://loadtest.invalid/{key}/", "Testi")
+        )
+        sources.append(key)
+
+    async def scrape_sources(wanted: list[ComicSource]):
+        return {source.key: fake_comic(source.key) for source in wanted}
+
+    fingerpori_scraper.scrape_sources = scrape_sources
+
+    db = DbManager(os.environ["DB"])
+    bot = fingerpori_bot.FingerporiBot(db=db)
+    phases: list[dict[str, Any]] = []
+    rng = random.Random(args.seed)
+    try:
+        await bot.login(os.environ["TOKEN"])
+
+        polls = int(args.guilds * args.poll_share)
+        rows = [
+            (
+                10**17 + g,
+                10**17 + 10**6 + g,
+                RatingMode.POLL if g < polls else RatingMode.VIEW,
+            )
+            for g in range(args.guilds)
+        ]
+        await db.connection.executemany(
+            """
+            INSERT OR IGNORE INTO guild (guild_id, channel_id, rating_mode)
+            VALUES (?, ?, ?)
+            """,
+            rows,
+        )
+        await db.connection.executemany(
+            "INSERT OR IGNORE INTO subscription (guild_id, source) VALUES (?, ?)",
+            [(row[0], source) for row in rows for source in sources],
+        )
+        await db.connection.commit()
+        # the guilds went in behind DbManager's back
+        db.clear_cache()
+        for guild_id, channel_id, _ in rows:
+            fake.add_channel(channel_id, guild_id)
+
+        posts_cog = bot.get_cog("PostsCog")
+        vote_cog = bot.get_cog("VoteCog")
+        if not isinstance(posts_cog, fingerpori_bot.PostsCog) or not isinstance(
+            vote_cog, fingerpori_bot.VoteCog
+        ):
+            raise RuntimeError("cogs not loaded")
+
+        before = fake.snapshot()
+        start = time.perf_counter()
+        await posts_cog.send_to_discord()
+        phases.append(
+            phase_report(
+                "send_to_discord",
+                fake,
+                before,
+                time.perf_counter() - start,
+                len(fake.messages),
+            )
+        )
+
+        messages = [m for m in fake.messages.values() if m["components"]]
+        if not messages:
+            raise RuntimeError("fan-out posted no buttons")
+        latencies: list[float] = []
+        semaphore = asyncio.Semaphore(args.concurrency)
+        interaction_ids = itertools.count(1 << 59)
+
+        async def click(i: int):
+            message = rng.choice(messages)
+            buttons = rng.choice(message["components"])["components"]
+            comic_id = buttons[0]["custom_id"].split(":")[1]
+            custom_id = f"fpori:{comic_id}:{rng.randint(1, 5)}"
+            payload = interaction_payload(
+                next(interaction_ids), message, 10**12 + i, custom_id
+            )
+            async with semaphore:
+                interaction = discord.Interaction(
+                    data=payload,  # pyright: ignore[reportArgumentType]
+                    state=bot._connection,  # pyright: ignore[reportPrivateUsage]
+                )
+                started = time.perf_counter()
+                try:
+                    await vote_cog.on_interaction(interaction)
+                except Exception as e:
+                    logger.warning(f"interaction {i} failed: {e}")
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        before = fake.snapshot()
+        start = time.perf_counter()
+        await asyncio.gather(*(click(i) for i in range(args.interactions)))
+        phases.append(
+            phase_report(
+                "on_interaction",
+                fake,
+                before,
+                time.perf_counter() - start,
+                len(latencies),
+                latencies,
+            )
+        )
+
+        before = fake.snapshot()
+        start = time.perf_counter()
+        await vote_cog.close_polls()
+        phases.append(
+            phase_report(
+                "close_polls",
+                fake,
+                before,
+                time.perf_counter() - start,
+                len(fake.messages),
+            )
+        )
+    finally:
+        await bot.close()
+        if db.conn:
+            await db.close()
+        await fake.stop()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "phases": phases,
+        "outbound": bot.outbound.stats(),
+        "db_cache": db.cache_stats(),
+    }
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run FingerporiBot against a local fake Discord API"
+    )
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--interactions", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument(
+        "--bucket-limit", type=int, default=5, help="requests per bucket window"
+    )
+    parser.add_argument("--bucket-window", type=float, default=5.0)
+    parser.add_argument(
+        "--ratelimit-chance",
+        type=float,
+        default=0.0,
+        help="chance of an unannounced 429 per request",
+    )
+    parser.add_argument(
+        "--poll-share",
+        type=float,
+        default=0.0,
+        help="share of guilds rating with native polls instead of buttons",
+    )
+    parser.add_argument(
+        "--sources",
+        type=int,
+        default=1,
+        help="comic sources every guild subscribes to, extra ones are fake",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the json report here")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    # logging is configured by fingerpori_bot when main() imports it
+    asyncio.run(main(args))
@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import override
+
+import discord
+from discord.utils import _ColourFormatter  # pyright: ignore[reportPrivateUsage]
+
+LOG_FORMAT = "[{asctime}] [{levelname:<8}] {name}: {message}"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per line, for log shippers"""
+
+    @override
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are
+
+    The stock prepare() formats the message on the calling thread so the
+    record can be pickled. The queue never leaves this process, so the
+    formatting is left to the listener thread.
+    """
+
+    @override
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    path: str = "bot.log",
+    max_bytes: int = 10 * 1024 * 1024,
+    backups: int = 5,
+    json_output: bool = False,
+) -> QueueListener:
+    """
+    Routes all logging through a queue to a background thread
+
+    Log calls only append to an in-memory queue. The listener thread formats
+    records and writes them to the console and a size rotated file, so disk
+    writes never happen on the event loop. The listener is stopped and the
+    queue flushed at exit.
+
+    Args:
+        level (int): Root log level
+        path (str): Log file, appended to and rotated at `max_bytes`
+        max_bytes (int): Size of a log file before rotating, 0 never rotates
+        backups (int): Rotated files to keep
+        json_output (bool): Write the file as json lines instead of text
+
+    Returns:
+        The started listener
+    """
+    console_handler = logging.StreamHandler(sys.stderr)
+    if discord.utils.stream_supports_colour(console_handler.stream):
+        console_handler.setFormatter(
+            _ColourFormatter(LOG_FORMAT, datefmt=DATE_FORMAT, style="{")
+        )
+    else:
+        console_handler.setFormatter(
+            logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT, style="{")
+        )
+
+    file_handler = RotatingFileHandler(
+        path, mode="a", maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+    )
+    file_handler.setFormatter(
+        JsonFormatter()
+        if json_output
+        else logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT, style="{")
+    )
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_DeferredQueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+    listener = QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
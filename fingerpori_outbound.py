@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, TypeVar
+
+logger = logging.getLogger("fingerpori_outbound")
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTION = 0
+    CLOSE = 1
+    POST = 2
+
+
+@dataclass
+class _Job:
+    bucket: str
+    factory: Callable[[], Awaitable[Any]]
+    future: "asyncio.Future[Any]"
+
+
+class OutboundScheduler:
+    """
+    Orders outbound Discord API calls by priority class
+
+    Interaction responses are served first and always have `reserved`
+    workers of their own, so a poll close or post burst can't push button
+    acknowledgements past Discord's 3 second deadline. Calls sharing a
+    bucket are spaced at least `bucket_interval` seconds apart, and
+    submit() blocks while a priority class already has `max_queue` calls
+    waiting.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        reserved: int = 1,
+        max_queue: int = 1000,
+        bucket_interval: float = 0.25,
+    ):
+        self.workers: int = workers
+        self.reserved: int = reserved
+        self.max_queue: int = max_queue
+        self.bucket_interval: float = bucket_interval
+
+        self._queues: dict[Priority, deque[_Job]] = {p: deque() for p in Priority}
+        self._cond: asyncio.Condition | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._next_at: dict[str, float] = {}
+        self.in_flight: Counter[Priority] = Counter()
+        self.completed: Counter[Priority] = Counter()
+        self.max_depth: Counter[Priority] = Counter()
+
+    @property
+    def cond(self) -> asyncio.Condition:
+        if self._cond is None:
+            raise RuntimeError("OutboundScheduler.start() was never called")
+        return self._cond
+
+    def start(self):
+        if self._tasks:
+            return
+        self._cond = asyncio.Condition()
+        everything = tuple(Priority)
+        for _ in range(self.reserved):
+            self._tasks.append(
+                asyncio.create_task(self._worker((Priority.INTERACTION,)))
+            )
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(everything)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for queue in self._queues.values():
+            while queue:
+                queue.popleft().future.cancel()
+
+    async def submit(
+        self, priority: Priority, bucket: str, factory: Callable[[], Awaitable[T]]
+    ) -> T:
+        """
+        Queues an API call and waits for its result
+
+        Args:
+            priority (Priority): Priority class of the call
+            bucket (str): Rate limit bucket, e.g. "channel:<id>"
+            factory (Callable): Creates the coroutine making the call
+
+        Raises:
+            Whatever the call raises
+        """
+        queue = self._queues[priority]
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        async with self.cond:
+            await self.cond.wait_for(lambda: len(queue) < self.max_queue)
+            queue.append(_Job(bucket, factory, future))
+            self.max_depth[priority] = max(self.max_depth[priority], len(queue))
+            self.cond.notify_all()
+        return await future
+
+    def queue_depths(self) -> dict[str, int]:
+        return {p.name.lower(): len(self._queues[p]) for p in Priority}
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            p.name.lower(): {
+                "queued": len(self._queues[p]),
+                "in_flight": self.in_flight[p],
+                "completed": self.completed[p],
+                "max_queued": self.max_depth[p],
+            }
+            for p in Priority
+        }
+
+    async def _worker(self, priorities: tuple[Priority, ...]):
+        while True:
+            async with self.cond:
+                await self.cond.wait_for(
+                    lambda: any(self._queues[p] for p in priorities)
+                )
+                priority = next(p for p in priorities if self._queues[p])
+                job = self._queues[priority].popleft()
+                # wake submitters waiting on a full queue
+                self.cond.notify_all()
+            if job.future.done():
+                continue
+            self.in_flight[priority] += 1
+            try:
+                await self._pace(priority, job.bucket)
+                result = await job.factory()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self.in_flight[priority] -= 1
+                self.completed[priority] += 1
+
+    async def _pace(self, priority: Priority, bucket: str):
+        if priority == Priority.INTERACTION or self.bucket_interval <= 0:
+            return
+        now = time.monotonic()
+        at = max(now, self._next_at.get(bucket, 0.0))
+        self._next_at[bucket] = at + self.bucket_interval
+        if len(self._next_at) > 10000:
+            self._next_at = {b: t for b, t in self._next_at.items() if t > now}
+        if at > now:
+            await asyncio.sleep(at - now)
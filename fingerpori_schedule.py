@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone
+from enum import StrEnum
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger("fingerpori_schedule")
+
+
+class TimerKind(StrEnum):
+    CLOSE = "close"
+    POST = "post"
+
+
+@dataclass(order=True)
+class _Timer:
+    at: datetime
+    seq: int
+    kind: TimerKind = field(compare=False)
+    guild_id: int = field(compare=False)
+    generation: int = field(compare=False)
+
+
+@dataclass
+class GuildSchedule:
+    post_time: time
+    tz: ZoneInfo
+    offset: timedelta  # spreads guilds sharing a post time
+
+
+def next_fire(
+    now: datetime, local_time: time, tz: ZoneInfo, shift: timedelta
+) -> datetime:
+    """
+    Next UTC instant after `now` when the wall clock in `tz` shows
+    `local_time` + `shift`. Computed from the local date every time, so the
+    UTC offset follows DST changes.
+    """
+    local_now = now.astimezone(tz)
+    for days in range(3):
+        day = local_now.date() + timedelta(days=days)
+        candidate = (datetime.combine(day, local_time, tzinfo=tz) + shift).astimezone(
+            timezone.utc
+        )
+        if candidate > now:
+            return candidate
+    raise ValueError(f"no next fire time for {local_time} in {tz}")
+
+
+def last_fire(
+    now: datetime, local_time: time, tz: ZoneInfo, shift: timedelta
+) -> datetime:
+    """Latest UTC instant at or before `now` when next_fire would have fired"""
+    local_now = now.astimezone(tz)
+    for days in range(3):
+        day = local_now.date() - timedelta(days=days)
+        candidate = (datetime.combine(day, local_time, tzinfo=tz) + shift).astimezone(
+            timezone.utc
+        )
+        if candidate <= now:
+            return candidate
+    raise ValueError(f"no last fire time for {local_time} in {tz}")
+
+
+class GuildScheduler:
+    """
+    Fires post and poll close callbacks per guild from a single timer heap
+
+    Every guild has one pending post timer and one pending close timer. When
+    a timer fires the next one for the same guild is pushed, so the heap
+    holds two entries per guild. Rescheduling a guild bumps its generation
+    and stale entries are dropped when they reach the top of the heap.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[TimerKind, int], Awaitable[None]],
+        close_before: timedelta,
+    ):
+        self.callback: Callable[[TimerKind, int], Awaitable[None]] = callback
+        self.close_before: timedelta = close_before
+        self.schedules: dict[int, GuildSchedule] = {}
+        self._heap: list[_Timer] = []
+        self._generation: dict[int, int] = {}
+        self._seq: int = 0
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._running: set[asyncio.Task[None]] = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule_guild(self, guild_id: int, schedule: GuildSchedule):
+        generation = self._generation.get(guild_id, 0) + 1
+        self._generation[guild_id] = generation
+        self.schedules[guild_id] = schedule
+        now = datetime.now(timezone.utc)
+        self._push(TimerKind.CLOSE, guild_id, generation, now)
+        self._push(TimerKind.POST, guild_id, generation, now)
+        self._wakeup.set()
+
+    def remove_guild(self, guild_id: int):
+        self._generation[guild_id] = self._generation.get(guild_id, 0) + 1
+        self.schedules.pop(guild_id, None)
+
+    def next_runs(self, guild_id: int) -> dict[TimerKind, datetime]:
+        generation = self._generation.get(guild_id)
+        return {
+            timer.kind: timer.at
+            for timer in self._heap
+            if timer.guild_id == guild_id and timer.generation == generation
+        }
+
+    def _push(self, kind: TimerKind, guild_id: int, generation: int, now: datetime):
+        schedule = self.schedules[guild_id]
+        shift = schedule.offset
+        if kind == TimerKind.CLOSE:
+            shift -= self.close_before
+        at = next_fire(now, schedule.post_time, schedule.tz, shift)
+        self._seq += 1
+        heapq.heappush(self._heap, _Timer(at, self._seq, kind, guild_id, generation))
+
+    async def _run(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            while self._heap and self._heap[0].at <= now:
+                timer = heapq.heappop(self._heap)
+                if timer.generation != self._generation.get(timer.guild_id):
+                    continue
+                self._push(timer.kind, timer.guild_id, timer.generation, timer.at)
+                task = asyncio.create_task(self._fire(timer))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            self._wakeup.clear()
+            timeout = (
+                (self._heap[0].at - now).total_seconds() if self._heap else None
+            )
+            try:
+                # wake at least every minute in case the wall clock jumps
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=min(timeout or 60.0, 60.0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, timer: _Timer):
+        try:
+            await self.callback(timer.kind, timer.guild_id)
+        except Exception as e:
+            logger.error(f"{timer.kind} for guild {timer.guild_id} failed: {e}")
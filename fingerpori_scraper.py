@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import hashlib
 import logging
 import os
 import re
@@ -10,112 +12,298 @@ import discord
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright
 
-from fingerpori_db import DbManager
+from fingerpori_db import DEFAULT_SOURCE, DbManager, DeliveryState, image_hash
+from fingerpori_sources import SOURCES, ComicSource
 
 load_dotenv()
 
-TARGET_URL = "https://www.hs.fi/sarjakuvat/fingerpori/"
+TARGET_URL = SOURCES[DEFAULT_SOURCE].url
 IMAGE_PATH = "images/"
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+# seconds between page checks in watch mode
+WATCH_INTERVAL = 120
+# links to single strips, a new strip adds one
+ARTICLE_LINK = re.compile(r"/sarjakuvat/[\w-]+/art-\d+")
+# webhooks sent to at once, and tries per webhook
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "50"))
+WEBHOOK_RETRIES = 3
+# delivery outcomes are written this many webhooks at a time
+DELIVERY_BATCH = 50
 
 logger = logging.getLogger("fingerpori_scraper")
 
-def get_year(comic_month: int):
-    now = datetime.now()
-    year = now.year
+async def scrape_sources(
+    sources: list[ComicSource],
+) -> dict[str, dict[str, str | bytes | None] | None]:
+    """
+    Scrapes several strips at once in one browser
 
-    if now.month == 1 and comic_month == 12:
-        year -= 1
-    return year
+    Every source gets its own page in a shared context, so launching the
+    browser is paid once however many strips there are.
 
-
-async def get_latest_fingerpori() -> dict[str,(str | bytes | None)] | None:
+    Returns:
+        {source key: comic dict or None if it wasn't found}
+    """
+    if not sources:
+        return {}
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-
-        await page.goto(TARGET_URL, wait_until="networkidle")
-        await page.mouse.wheel(0, 500)
-        time.sleep(2)
-
-        article = page.locator("article").first
-        if await article.count() == 0:
-            return None
-
-        img_locator = article.get_by_alt_text(re.compile(r"Pertti Jarla")).first
-        date_locator = article.locator("span.timestamp-label").first
-
-        if await img_locator.count() > 0:
-            img_url = await img_locator.get_attribute("src")
-            if not img_url:
-                logger.critical("image url not found!")
-                return None
-            if "468.jpg" in img_url:
-                # img_url = img_url.replace("468.jpg", "978.jpg")
-                img_url = img_url.replace("468.jpg", "1920.jpg")
-            
-            response = await page.request.get(img_url)
-            if response.status == 200:
-                img_bytes = await response.body()
-            else:
-                img_bytes = None
-                logger.critical(f"failed to download image with code: {response.status}")
-
-            raw_date = await date_locator.inner_text() if await date_locator.count() > 0 else ""
-            match = re.search(r"(\d{1,2}\.\d{1,2}\.)", raw_date)
-            if match:
-                date_str = match.group(1)
-                date_str += str(get_year(int(date_str.split(".")[1])))
-                date = datetime.strptime(date_str, "%d.%m.%Y").strftime("%Y-%m-%d")
-            else:
-                date = datetime.now().strftime("%Y-%m-%d")
-    
-            return {
-                "date": date,
-                "url": img_url,
-                "bytes": img_bytes
-            }
-    
-        return None
-
-async def send_to_webhook(comic:dict[str,(str|bytes|None)] | None):
-    if not WEBHOOK_URL:
-        return logger.critical("no webhook url provided")
-    
-    async with aiohttp.ClientSession() as session:
-        webhook = discord.Webhook.from_url(WEBHOOK_URL, session=session)
-        if comic:
-            img_date:str = comic["date"] # pyright: ignore[reportAssignmentType]
-            img_url:str = comic["url"] # pyright: ignore[reportAssignmentType]
-            img_bytes:bytes = comic["bytes"] # pyright: ignore[reportAssignmentType]
-
-            datef = datetime.strptime(img_date, "%Y-%m-%d").strftime("%d.%m.%Y")
-
-            embed = discord.Embed(
-                title="Päivän Fingerpori",
-                color=5814783,
-            )
-            embed.set_image(url=img_url)
-            embed.set_footer(text=f"Fingerpori {datef}")
+        try:
+            context = await browser.new_context(user_agent=USER_AGENT)
 
-            if db.conn:
-                await db.save_comic(img_date, img_url, img_bytes)
-            else:
-                logger.warning(f"could not save comic to db: {img_date} {img_url}")
+            async def scrape(source: ComicSource):
+                page = await context.new_page()
+                try:
+                    return await source.extract(page)
+                except Exception as e:
+                    logger.error(f"scraping {source.key} failed: {e}")
+                    return None
+                finally:
+                    await page.close()
+
+            results = await asyncio.gather(*(scrape(source) for source in sources))
+        finally:
+            await browser.close()
+    return {source.key: result for source, result in zip(sources, results)}
+
+
+async def get_latest_fingerpori() -> dict[str,(str | bytes | None)] | None:
+    return (await scrape_sources([SOURCES[DEFAULT_SOURCE]]))[DEFAULT_SOURCE]
+
+
+def page_fingerprint(html: str) -> str:
+    """Hash of the strip links on the page, the whole page if there are none"""
+    links = sorted(set(ARTICLE_LINK.findall(html)))
+    key = " ".join(links) if links else html
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class PageWatcher:
+    """
+    Cheap check for changes on the comic page
+
+    Sends a plain GET with If-None-Match / If-Modified-Since from the last
+    response, so an unchanged page costs a 304. When the server answers
+    with a full page anyway, the strip links on it are compared instead.
+    The first check always counts as a change.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str = TARGET_URL):
+        self.session: aiohttp.ClientSession = session
+        self.url: str = url
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.fingerprint: str | None = None
+
+    async def changed(self) -> bool:
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        async with self.session.get(self.url, headers=headers) as response:
+            if response.status == 304:
+                return False
+            response.raise_for_status()
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            html = await response.text()
+        fingerprint = page_fingerprint(html)
+        changed = fingerprint != self.fingerprint
+        self.fingerprint = fingerprint
+        return changed
+
+
+def build_embed(img_date: str, img_url: str) -> discord.Embed:
+    datef = datetime.strptime(img_date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    embed = discord.Embed(
+        title="Päivän Fingerpori",
+        color=5814783,
+    )
+    embed.set_image(url=img_url)
+    embed.set_footer(text=f"Fingerpori {datef}")
+    return embed
+
+
+async def send_with_retries(
+    session: aiohttp.ClientSession, url: str, embed: discord.Embed
+) -> tuple[DeliveryState, int, str | None, bool]:
+    """
+    Sends the embed to one webhook, returns (state, attempts, error, gone)
 
+    discord.py already waits out 429s per webhook, this retries what is left
+    over: server errors and dropped connections.
+    """
+    error = None
+    for attempt in range(1, WEBHOOK_RETRIES + 1):
+        try:
+            webhook = discord.Webhook.from_url(url, session=session)
             await webhook.send(embed=embed)
+            return DeliveryState.SENT, attempt, None, False
+        except (ValueError, discord.NotFound, discord.Forbidden) as e:
+            # deleted webhook or a broken url, retrying won't help
+            return DeliveryState.FAILED, attempt, str(e), True
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or type(e).__name__
+            if attempt < WEBHOOK_RETRIES:
+                await asyncio.sleep(2**attempt)
+    return DeliveryState.FAILED, WEBHOOK_RETRIES, error, False
 
+
+async def deliver_webhooks(
+    session: aiohttp.ClientSession, comic_id: int, embed: discord.Embed
+):
+    """
+    Sends a comic to every active webhook that hasn't got it yet
+
+    Webhooks are sent to concurrently through the one session, at most
+    WEBHOOK_CONCURRENCY at a time. Outcomes are stored DELIVERY_BATCH at a
+    time, failed webhooks are tried again on the next run and deleted ones
+    are disabled.
+    """
+    targets = await db.get_undelivered_webhooks(comic_id)
+    semaphore = asyncio.Semaphore(WEBHOOK_CONCURRENCY)
+    done: list[tuple[int, DeliveryState, int, str | None]] = []
+    gone: list[int] = []
+    sent = 0
+    start = time.perf_counter()
+
+    async def send(webhook_id: int, url: str):
+        nonlocal sent
+        async with semaphore:
+            state, attempts, error, is_gone = await send_with_retries(
+                session, url, embed
+            )
+        if state == DeliveryState.SENT:
+            sent += 1
         else:
-            await webhook.send(content="botti rikki :/")
+            logger.warning(f"webhook {webhook_id} failed after {attempts} tries: {error}")
+        if is_gone:
+            gone.append(webhook_id)
+        done.append((webhook_id, state, attempts, error))
+        if len(done) >= DELIVERY_BATCH:
+            batch = done.copy()
+            done.clear()
+            await db.finish_webhook_deliveries(comic_id, batch)
 
-async def main():
-    await db.connect()
+    await asyncio.gather(*(send(webhook_id, url) for webhook_id, url in targets))
+    if done:
+        await db.finish_webhook_deliveries(comic_id, done)
+    if gone:
+        await db.disable_webhooks(gone)
+    logger.info(
+        f"comic {comic_id} sent to {sent}/{len(targets)} webhooks "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+async def send_to_webhook(
+    comic: dict[str, (str | bytes | None)] | None, img_hash: str | None = None
+):
+    connector = aiohttp.TCPConnector(limit=WEBHOOK_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        if not comic:
+            logger.critical("botti rikki :/")
+            if WEBHOOK_URL:
+                webhook = discord.Webhook.from_url(WEBHOOK_URL, session=session)
+                await webhook.send(content="botti rikki :/")
+            return
+
+        img_date:str = comic["date"] # pyright: ignore[reportAssignmentType]
+        img_url:str = comic["url"] # pyright: ignore[reportAssignmentType]
+        img_bytes:bytes | None = comic["bytes"] # pyright: ignore[reportAssignmentType]
+
+        if img_bytes is None:
+            logger.error(f"no image downloaded for {img_date}, not posting")
+            return
+
+        if img_hash is None:
+            img_hash = await asyncio.to_thread(image_hash, img_bytes)
+        stored = await db.save_comic(img_date, img_url, img_bytes, img_hash)
+        if stored is None:
+            # already stored by an earlier run, finish its deliveries
+            latest = await db.get_past_n_comics(1)
+            if not latest or latest[0].date != img_date:
+                logger.warning(f"could not save comic to db: {img_date} {img_url}")
+                return
+            stored = latest[0]
+
+        await deliver_webhooks(session, stored.id, build_embed(img_date, img_url))
+
+async def scrape_if_new():
+    """Runs the full extraction and sends the comic unless it is already stored"""
     comic = await get_latest_fingerpori()
-    await send_to_webhook(comic)
+    img_bytes = comic["bytes"] if comic else None
+    if not comic or not isinstance(img_bytes, bytes):
+        logger.warning("page changed but no comic was found")
+        return
+    img_hash = await asyncio.to_thread(image_hash, img_bytes)
+    if img_hash == await db.latest_hash():
+        logger.info("latest comic is already stored")
+        return
+    await send_to_webhook(comic, img_hash)
+
+
+async def watch(interval: float = WATCH_INTERVAL):
+    """Polls the comic page and scrapes only when it changed"""
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(
+        headers={"User-Agent": USER_AGENT}, timeout=timeout
+    ) as session:
+        watcher = PageWatcher(session)
+        while True:
+            try:
+                if await watcher.changed():
+                    logger.info("comic page changed, scraping")
+                    await scrape_if_new()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"checking {TARGET_URL} failed: {e}")
+            except Exception as e:
+                # a broken browser, webhook or db must not end the watcher
+                logger.error(f"scraping in watch mode failed: {e}")
+            await asyncio.sleep(interval)
+
+
+async def main(args: argparse.Namespace):
+    await db.connect()
+    try:
+        if WEBHOOK_URL:
+            await db.add_webhook(WEBHOOK_URL)
+        if args.add_webhook:
+            for url in args.add_webhook:
+                await db.add_webhook(url)
+        elif args.remove_webhook:
+            for url in args.remove_webhook:
+                if not await db.remove_webhook(url):
+                    logger.warning(f"no active webhook {url}")
+        elif args.watch:
+            await watch(args.interval)
+        else:
+            comic = await get_latest_fingerpori()
+            await send_to_webhook(comic)
+    finally:
+        await db.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the latest Fingerpori")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep polling the page and scrape when it changes",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=WATCH_INTERVAL,
+        help="seconds between page checks in watch mode",
+    )
+    parser.add_argument(
+        "--add-webhook", nargs="+", metavar="URL", help="add webhooks to send to"
+    )
+    parser.add_argument(
+        "--remove-webhook", nargs="+", metavar="URL", help="stop sending to webhooks"
+    )
+    args = parser.parse_args()
     db = DbManager()
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(args))
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import override
+
+from playwright.async_api import Page
+
+from fingerpori_db import DEFAULT_SOURCE
+
+logger = logging.getLogger("fingerpori_sources")
+
+
+def get_year(comic_month: int):
+    now = datetime.now()
+    year = now.year
+
+    if now.month == 1 and comic_month == 12:
+        year -= 1
+    return year
+
+
+class ComicSource(ABC):
+    """
+    A strip the scraper knows how to find
+
+    Subclass it, implement extract() and register() an instance. `key` is
+    stored with every comic and in guild subscriptions, so it must never
+    change once used.
+    """
+
+    def __init__(self, key: str, name: str, url: str):
+        self.key: str = key
+        self.name: str = name
+        self.url: str = url
+
+    @abstractmethod
+    async def extract(self, page: Page) -> dict[str, str | bytes | None] | None:
+        """
+        Finds the latest strip on a fresh page of the shared browser context
+
+        Returns:
+            {"date": "YYYY-MM-DD", "url": image url, "bytes": image} or None
+        """
+
+
+class HsStrip(ComicSource):
+    """Strips on hs.fi/sarjakuvat, the image is found by the author in its alt text"""
+
+    def __init__(self, key: str, name: str, url: str, author: str):
+        super().__init__(key, name, url)
+        self.author: re.Pattern[str] = re.compile(re.escape(author))
+
+    @override
+    async def extract(self, page: Page) -> dict[str, str | bytes | None] | None:
+        await page.goto(self.url, wait_until="networkidle")
+        await page.mouse.wheel(0, 500)
+        await asyncio.sleep(2)
+
+        article = page.locator("article").first
+        if await article.count() == 0:
+            return None
+
+        img_locator = article.get_by_alt_text(self.author).first
+        date_locator = article.locator("span.timestamp-label").first
+
+        if await img_locator.count() == 0:
+            return None
+
+        img_url = await img_locator.get_attribute("src")
+        if not img_url:
+            logger.critical(f"{self.key}: image url not found!")
+            return None
+        if "468.jpg" in img_url:
+            # img_url = img_url.replace("468.jpg", "978.jpg")
+            img_url = img_url.replace("468.jpg", "1920.jpg")
+
+        response = await page.request.get(img_url)
+        if response.status == 200:
+            img_bytes = await response.body()
+        else:
+            img_bytes = None
+            logger.critical(
+                f"{self.key}: failed to download image with code: {response.status}"
+            )
+
+        raw_date = (
+            await date_locator.inner_text() if await date_locator.count() > 0 else ""
+        )
+        match = re.search(r"(\d{1,2}\.\d{1,2}\.)", raw_date)
+        if match:
+            date_str = match.group(1)
+            date_str += str(get_year(int(date_str.split(".")[1])))
+            date = datetime.strptime(date_str, "%d.%m.%Y").strftime("%Y-%m-%d")
+        else:
+            date = datetime.now().strftime("%Y-%m-%d")
+
+        return {"date": date, "url": img_url, "bytes": img_bytes}
+
+
+SOURCES: dict[str, ComicSource] = {}
+
+
+def register(source: ComicSource) -> ComicSource:
+    SOURCES[source.key] = source
+    return source
+
+
+register(
+    HsStrip(
+        DEFAULT_SOURCE,
+        "Fingerpori",
+        "https://www.hs.fi/sarjakuvat/fingerpori/",
+        "Pertti Jarla",
+    )
+)
+register(
+    HsStrip(
+        "viivijawagner",
+        "Viivi ja Wagner",
+        "https://www.hs.fi/sarjakuvat/viivijawagner/",
+        "Tuomola",
+    )
+)
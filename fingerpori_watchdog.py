@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger("fingerpori_watchdog")
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag and catches what blocks the loop
+
+    A heartbeat task sleeps `interval` seconds at a time and records how late
+    it wakes up. A separate thread checks the heartbeat, and when it is more
+    than `threshold` seconds overdue it grabs the loop thread's current stack
+    with sys._current_frames(), so the blocking call is logged while it is
+    still running, even if the loop never recovers. Stalls and lag samples
+    are kept for stats().
+    """
+
+    def __init__(
+        self, threshold: float = 0.25, interval: float = 0.1, samples: int = 3000
+    ):
+        self.threshold: float = threshold
+        self.interval: float = interval
+        self.lags: deque[float] = deque(maxlen=samples)
+        self.stalls: int = 0
+        self.max_lag: float = 0.0
+        self.last_stack: str = ""
+
+        self._beat: float = 0.0
+        self._loop_thread: int | None = None
+        self._captured: bool = False
+        self._task: asyncio.Task[None] | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped: threading.Event = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def stats(self) -> dict[str, float | int]:
+        lags = sorted(self.lags)
+
+        def percentile(p: float) -> float:
+            if not lags:
+                return 0.0
+            return lags[min(len(lags) - 1, int(p / 100 * len(lags)))] * 1000
+
+        return {
+            "stalls": self.stalls,
+            "samples": len(lags),
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "max_ms": self.max_lag * 1000,
+        }
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._captured = False
+            if lag >= self.threshold:
+                self.stalls += 1
+                logger.warning(f"event loop was blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self):
+        # checked twice per threshold so a stall is caught while it is going on
+        while not self._stopped.wait(self.threshold / 2):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue < self.threshold or self._captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread or 0)  # pyright: ignore[reportPrivateUsage]
+            if frame is None:
+                continue
+            self._captured = True
+            self.last_stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"event loop stalled for over {overdue * 1000:.0f} ms, "
+                f"loop thread is at:\n{self.last_stack}"
+            )